@@ -0,0 +1,174 @@
+# telegram_kali_bot/cogs/canonical_answers.py
+
+import atexit
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from logging.handlers import RotatingFileHandler
+
+from cogs.logging_setup import queued_handler
+
+logger = logging.getLogger(__name__)
+
+# Lưu cạnh Chroma index (cùng volume) để mọi worker đều đọc được.
+CANONICAL_ANSWERS_FILE = "./chroma_db/canonical_answers.json"
+# Log các câu hỏi /ask_kali (JSON lines) để chọn top-N tool khi precompute. Chứa câu hỏi thô của user
+# nên mặc định tắt (ASK_KALI_REQUEST_LOG_ENABLED=1 để bật). Xoay vòng theo dung lượng: tổng tối đa
+# (REQUEST_LOG_BACKUP_COUNT + 1) * ASK_KALI_REQUEST_LOG_MAX_BYTES.
+REQUEST_LOG_FILE = os.getenv("ASK_KALI_REQUEST_LOG", "./chroma_db/ask_kali_requests.jsonl")
+REQUEST_LOG_ENABLED = os.getenv("ASK_KALI_REQUEST_LOG_ENABLED", "0") == "1"
+REQUEST_LOG_MAX_BYTES = int(os.getenv("ASK_KALI_REQUEST_LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+REQUEST_LOG_BACKUP_COUNT = 2
+
+# Cụm từ chỉ ý định "cách dùng <tool>". Sau khi bỏ chúng đi, phần còn lại phải đúng bằng tên tool
+# thì mới coi là khớp với độ tin cậy cao.
+_USAGE_INTENT_PHRASES = [
+    "how do i use", "how to use", "how to install", "usage of", "usage", "examples", "example", "help",
+    "hướng dẫn sử dụng", "cách sử dụng", "cách dùng", "sử dụng", "hướng dẫn", "cài đặt", "dùng",
+    "như thế nào", "thế nào", "ra sao", "làm sao", "công cụ", "tool", "lệnh", "command",
+]
+# Chỉ bỏ cụm từ đứng riêng: "command" trong "command-not-found" là một phần tên tool.
+_USAGE_INTENT_REGEX = re.compile(
+    r"(?<![\w-])(" + "|".join(re.escape(p) for p in sorted(_USAGE_INTENT_PHRASES, key=len, reverse=True)) + r")(?![\w-])"
+)
+_TRAILING_PUNCTUATION_REGEX = re.compile(r"[?!.,:;\"'`]+")
+
+_request_logger = logging.getLogger("ask_kali_requests")
+_request_logger.propagate = False
+
+
+def canonical_question(tool_name: str) -> str:
+    return f"Cách sử dụng công cụ {tool_name} trên Kali Linux (mô tả, cách cài đặt và các lệnh/ví dụ chính)"
+
+
+def tool_record_hash(tool_record: dict) -> str:
+    return hashlib.sha256(json.dumps(tool_record, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def match_tool_name(query: str, tool_names_by_lower: dict[str, str]) -> str | None:
+    """Returns the tool name only when the query is clearly "how do I use <tool>" (or just "<tool>")."""
+    normalized = _TRAILING_PUNCTUATION_REGEX.sub(" ", query.lower())
+    normalized = _USAGE_INTENT_REGEX.sub(" ", normalized)
+    normalized = " ".join(normalized.split())
+    return tool_names_by_lower.get(normalized)
+
+
+def _init_request_logger(filepath: str) -> bool:
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+    except OSError as e:
+        logger.warning(f"Request log disabled, cannot create directory for {filepath}: {e}")
+        return False
+    # Nhiều worker ghi chung một file: xoay vòng chỉ là best-effort giữa các process,
+    # nhưng dung lượng tổng vẫn bị chặn. Ghi file chạy ở thread nền, không chặn event loop.
+    file_handler = RotatingFileHandler(filepath, maxBytes=REQUEST_LOG_MAX_BYTES,
+                                       backupCount=REQUEST_LOG_BACKUP_COUNT, encoding='utf-8', delay=True)
+    file_handler.setFormatter(logging.Formatter("%(message)s"))
+    _request_logger.addHandler(queued_handler(file_handler))
+    _request_logger.setLevel(logging.INFO)
+    return True
+
+
+def append_request_log(query: str, filepath: str = REQUEST_LOG_FILE) -> None:
+    if not REQUEST_LOG_ENABLED:
+        return
+    if not _request_logger.handlers and not _init_request_logger(filepath):
+        return
+    _request_logger.info(json.dumps({"ts": time.time(), "query": query}, ensure_ascii=False))
+
+
+def close_request_log() -> None:
+    # Flush mọi dòng còn trong queue ra file (listener.stop() chờ queue rỗng).
+    for handler in list(_request_logger.handlers):
+        _request_logger.removeHandler(handler)
+        atexit.unregister(handler.listener.stop)
+        handler.listener.stop()
+
+
+def load_request_log(filepath: str = REQUEST_LOG_FILE) -> list[str]:
+    queries = []
+    # File hiện tại + các bản đã xoay vòng (.1, .2, ...)
+    for path in [filepath] + sorted(glob.glob(glob.escape(filepath) + ".[0-9]*")):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        queries.append(json.loads(line)["query"])
+                    except (json.JSONDecodeError, KeyError, TypeError):
+                        continue
+        except FileNotFoundError:
+            pass
+    return queries
+
+
+class CanonicalAnswer:
+    __slots__ = ("source_hash", "answer_html", "generated_at")
+
+    def __init__(self, source_hash: str, answer_html: str, generated_at: str):
+        self.source_hash = source_hash
+        self.answer_html = answer_html
+        self.generated_at = generated_at
+
+    def to_dict(self) -> dict:
+        return {"source_hash": self.source_hash, "answer_html": self.answer_html, "generated_at": self.generated_at}
+
+
+class CanonicalAnswerStore:
+    def __init__(self, filepath: str = CANONICAL_ANSWERS_FILE):
+        self.filepath = filepath
+        self.entries: dict[str, CanonicalAnswer] = {}
+        self._tool_names_by_lower: dict[str, str] = {}
+
+    @classmethod
+    def load(cls, filepath: str = CANONICAL_ANSWERS_FILE) -> "CanonicalAnswerStore":
+        store = cls(filepath)
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                raw_entries = json.load(f).get("tools", {})
+            store.entries = {
+                name: CanonicalAnswer(entry.get("source_hash", ""), entry["answer_html"], entry.get("generated_at", ""))
+                for name, entry in raw_entries.items()
+            }
+            logger.info(f"Loaded {len(store.entries)} precomputed canonical answers from {filepath}.")
+        except FileNotFoundError:
+            logger.info(f"No precomputed canonical answers at {filepath}. All /ask_kali queries will be generated live.")
+        except (json.JSONDecodeError, AttributeError, KeyError, TypeError) as e:
+            logger.error(f"Error decoding canonical answers from {filepath}: {e}")
+        store._reindex()
+        return store
+
+    def _reindex(self) -> None:
+        self._tool_names_by_lower = {name.lower(): name for name in self.entries}
+
+    def lookup(self, query: str) -> str | None:
+        tool_name = match_tool_name(query, self._tool_names_by_lower)
+        if tool_name is None:
+            return None
+        return self.entries[tool_name].answer_html
+
+    def is_fresh(self, tool_name: str, source_hash: str) -> bool:
+        entry = self.entries.get(tool_name)
+        return entry is not None and entry.source_hash == source_hash
+
+    def put(self, tool_name: str, source_hash: str, answer_html: str) -> None:
+        self.entries[tool_name] = CanonicalAnswer(source_hash, answer_html, time.strftime('%Y-%m-%dT%H:%M:%S'))
+        self._tool_names_by_lower[tool_name.lower()] = tool_name
+
+    def prune(self, valid_tool_names: set[str]) -> int:
+        stale = [name for name in self.entries if name not in valid_tool_names]
+        for name in stale:
+            del self.entries[name]
+        self._reindex()
+        return len(stale)
+
+    def save(self) -> None:
+        # Ghi ra file tạm rồi os.replace để worker đang đọc không bao giờ thấy file dở dang.
+        os.makedirs(os.path.dirname(os.path.abspath(self.filepath)), exist_ok=True)
+        tmp_path = self.filepath + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": 1, "tools": {name: entry.to_dict() for name, entry in self.entries.items()}}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.filepath)
@@ -1,22 +1,46 @@
 # telegram_kali_bot/cogs/commands.py
 import logging
-from telegram import Update, error as telegram_error 
+import os
+from telegram import Update, InlineQueryResultArticle, InputTextMessageContent, error as telegram_error 
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 import re 
 import html 
-import bleach
-from cogs.translate import TranslationService
-from cogs.kali_rag import KaliRAGService
+import asyncio
+from typing import TYPE_CHECKING
+from cogs.resilience import CircuitOpenError
+from cogs.sanitize import sanitize_telegram_html
+from cogs.tool_index import ToolLookupIndex
+from cogs import index_snapshots
+from cogs.memory_profile import build_memory_report
+from cogs.logging_setup import RequestTimer, log_payload, new_request_id
+
+if TYPE_CHECKING:
+    # Chỉ dùng cho type hint: tránh kéo langchain/chromadb vào process không cần (vd: ingress).
+    from cogs.translate import TranslationService
+    from cogs.kali_rag import KaliRAGService
 
 logger = logging.getLogger(__name__)
 
-translation_service_instance: TranslationService = None
-kali_rag_service_instance: KaliRAGService = None
+translation_service_instance: "TranslationService" = None
+kali_rag_service_instance: "KaliRAGService" = None
+tool_index_instance: ToolLookupIndex = None
+
+INLINE_RESULTS_LIMIT = 10
+INLINE_USAGE_MAX_CHARS = 3000 # Telegram giới hạn tin nhắn 4096 ký tự
 
 def _escape_html(text: str, escape_quotes: bool = True) -> str:
     return html.escape(str(text), quote=escape_quotes)
 
+async def assign_request_id(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    # Đăng ký ở group -1: mọi log của update này (kể cả trong service) mang cùng request_id.
+    new_request_id(f"u{update.update_id}")
+
+def _is_admin(update: Update) -> bool:
+    # ADMIN_USER_IDS: danh sách Telegram user id, phân tách bằng dấu phẩy.
+    admin_ids = {x.strip() for x in os.getenv("ADMIN_USER_IDS", "").split(",") if x.strip()}
+    return update.effective_user is not None and str(update.effective_user.id) in admin_ids
+
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_name = update.effective_user.first_name
     await update.message.reply_text(
@@ -48,22 +72,30 @@ async def translate_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         logger.warning("TranslationService instance not initialized or LLM is None for translate_command.")
         return
 
-    await update.message.reply_text(
-        _escape_html("Đang thông dịch, vui lòng chờ..."), 
-        parse_mode=ParseMode.HTML
-    )
-    
+    timer = RequestTimer("translate")
+    status = "ok"
     try:
-        translated_text = await translation_service_instance.translate_text(text_to_translate)
+        with timer.stage("ack_reply"):
+            await update.message.reply_text(
+                _escape_html("Đang thông dịch, vui lòng chờ..."), 
+                parse_mode=ParseMode.HTML
+            )
+
+        with timer.stage("translate"):
+            translated_text = await translation_service_instance.translate_text(text_to_translate)
         # Ensure the pre tag content is also escaped for safety, though translate_text should provide plain text.
         response_message_html = f"Kết quả thông dịch:\n\n<pre>{_escape_html(translated_text)}</pre>"
-        await update.message.reply_html(response_message_html) 
+        with timer.stage("reply"):
+            await update.message.reply_html(response_message_html) 
     except Exception as e:
+        status = "error"
         logger.error(f"Lỗi khi thực hiện thông dịch: {e}", exc_info=True)
         await update.message.reply_text(
             _escape_html("Đã xảy ra lỗi khi thông dịch văn bản của bạn. Vui lòng thử lại."),
             parse_mode=ParseMode.HTML
         )
+    finally:
+        timer.finish(status)
 
 async def ask_kali_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not context.args:
@@ -75,44 +107,36 @@ async def ask_kali_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         return
 
     query = " ".join(context.args)
-    await update.message.reply_text(
-        f"Đang tìm kiếm gợi ý cho: <i>{_escape_html(query)}</i>...", 
-        parse_mode=ParseMode.HTML
-    )
-
-    if kali_rag_service_instance is None or \
-       kali_rag_service_instance.rag_chain_phase1 is None or \
-       kali_rag_service_instance.llm_chain_phase2 is None:
-        await update.message.reply_text(
-            _escape_html("Bot RAG chưa được khởi tạo đúng cách hoặc không khả dụng. Vui lòng thử lại sau hoặc thông báo cho admin."),
-            parse_mode=ParseMode.HTML
-        )
-        logger.error("KaliRAGService instance or its chains (Phase 1/2) are not initialized for ask_kali_command.")
-        return
-
+    timer = RequestTimer("ask_kali")
+    status = "ok"
     raw_response_from_llm = "" 
     final_html_to_send = ""
     try:
-        raw_response_from_llm = await kali_rag_service_instance.ask_question(query)
+        with timer.stage("ack_reply"):
+            await update.message.reply_text(
+                f"Đang tìm kiếm gợi ý cho: <i>{_escape_html(query)}</i>...", 
+                parse_mode=ParseMode.HTML
+            )
+
+        if kali_rag_service_instance is None or \
+           kali_rag_service_instance.rag_chain_phase1 is None or \
+           kali_rag_service_instance.llm_chain_phase2 is None:
+            status = "unavailable"
+            await update.message.reply_text(
+                _escape_html("Bot RAG chưa được khởi tạo đúng cách hoặc không khả dụng. Vui lòng thử lại sau hoặc thông báo cho admin."),
+                parse_mode=ParseMode.HTML
+            )
+            logger.error("KaliRAGService instance or its chains (Phase 1/2) are not initialized for ask_kali_command.")
+            return
+
+        with timer.stage("rag"):
+            raw_response_from_llm = await kali_rag_service_instance.ask_question(query)
         raw_response_from_llm = raw_response_from_llm.strip()
-        logger.info(f"LLM Raw HTML (before bleaching) for query '{_escape_html(query)}':\n---\n{raw_response_from_llm}\n---")
-
-        ALLOWED_TAGS = ['b', 'strong', 'i', 'em', 'u', 'ins', 's', 'strike', 'del', 
-                        'span', 'tg-spoiler', 'a', 'code', 'pre']
-        ALLOWED_ATTRIBUTES = {
-            'a': ['href'],
-            'span': ['class'], 
-            # 'tg-spoiler': [] # Not explicitly needed if no attributes
-        }
-        
-        # Bleach clean is the primary sanitizer.
-        # LLM is instructed to only use allowed tags and escape content within code/pre.
-        final_html_to_send = bleach.clean(raw_response_from_llm,
-                                          tags=ALLOWED_TAGS,
-                                          attributes=ALLOWED_ATTRIBUTES,
-                                          strip=True, 
-                                          strip_comments=True)
-        final_html_to_send = final_html_to_send.strip()
+        # Payload lớn: chỉ log đầy đủ theo tỉ lệ sample (LOG_PAYLOAD_SAMPLE_RATE), lỗi thì luôn log đầy đủ (log_payload error=True) bên dưới.
+        log_payload(logger, "LLM raw HTML (before bleaching)", raw_response_from_llm, query=query)
+
+        with timer.stage("sanitize"):
+            final_html_to_send = sanitize_telegram_html(raw_response_from_llm)
 
 
         # The re.sub for <br> and <p> are removed.
@@ -120,24 +144,25 @@ async def ask_kali_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         # If conversion (e.g. <br> to \n) was desired, tags would need to be allowed by bleach first.
 
         if final_html_to_send != raw_response_from_llm: # Log if bleach made any changes
-             logger.info(f"LLM HTML Response (after bleaching) for query '{_escape_html(query)}':\n---\n{final_html_to_send}\n---")
+            log_payload(logger, "LLM HTML (after bleaching)", final_html_to_send, query=query)
         
         if not final_html_to_send: # Handle case where bleaching results in empty string
-            logger.warning(f"Bleaching resulted in an empty string for query: '{_escape_html(query)}'. Raw response was: {raw_response_from_llm}")
+            status = "empty_response"
+            log_payload(logger, "Bleaching resulted in an empty string, raw LLM HTML", raw_response_from_llm, error=True, query=query)
             await update.message.reply_text(
                 _escape_html("AI không thể tạo phản hồi hợp lệ cho câu hỏi này. Vui lòng thử lại hoặc diễn đạt khác đi."),
                 parse_mode=ParseMode.HTML
             )
             return
 
-        await update.message.reply_text(final_html_to_send, parse_mode=ParseMode.HTML) 
+        with timer.stage("reply"):
+            await update.message.reply_text(final_html_to_send, parse_mode=ParseMode.HTML) 
         
     except telegram_error.BadRequest as e_tg_bad:
-        logger.error(
-            f"Telegram BadRequest sending LLM HTML response. Query: '{_escape_html(query)}'. "
-            f"Raw LLM HTML was:\n---\n{raw_response_from_llm}\n---\nProcessed HTML (sent to Telegram) was:\n---\n{final_html_to_send}\n---\nError: {e_tg_bad}", 
-            exc_info=True
-        )
+        status = "telegram_bad_request"
+        logger.error(f"Telegram BadRequest sending LLM HTML response: {e_tg_bad}", exc_info=True)
+        log_payload(logger, "Telegram BadRequest, raw LLM HTML", raw_response_from_llm, error=True, query=query)
+        log_payload(logger, "Telegram BadRequest, processed HTML sent to Telegram", final_html_to_send, error=True, query=query)
         try:
             # Fallback to plain text extraction from the processed HTML, or raw if processed is empty
             text_to_try = final_html_to_send if final_html_to_send else raw_response_from_llm
@@ -161,11 +186,22 @@ async def ask_kali_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
                 parse_mode=ParseMode.HTML
             )
 
+    except CircuitOpenError:
+        status = "circuit_open"
+        logger.warning(f"Kali RAG upstream circuit is open, failing fast for query '{_escape_html(query)}'.")
+        await update.message.reply_text(
+            _escape_html("Dịch vụ AI đang quá tải hoặc gián đoạn. Vui lòng thử lại sau ít phút."),
+            parse_mode=ParseMode.HTML
+        )
+
     except Exception as e:
+        status = "error"
         logger.error(f"Lỗi không xác định khi gọi Kali RAG service for query '{_escape_html(query)}': {e}", exc_info=True)
         error_detail = str(e)[:100] 
         user_error_message = _escape_html(f"Đã xảy ra lỗi khi xử lý yêu cầu của bạn. Vui lòng thử lại.\nChi tiết: {error_detail}")
         await update.message.reply_text(user_error_message, parse_mode=ParseMode.HTML)
+    finally:
+        timer.finish(status)
 
 async def echo_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if update.message.text and update.message.text.startswith('/'): 
@@ -195,7 +231,97 @@ Dưới đây là các lệnh bạn có thể sử dụng:
      <i>Ví dụ: <code>/translate hello world</code></i>
   • <code>/ask_kali sample</code> - Gợi ý công cụ Kali Linux và lệnh pentest dựa trên mô tả của bạn.
      <i>Ví dụ: <code>/ask_kali làm sao để quét cổng UDP bằng nmap</code></i> (This example is fine)
+  • <code>@tên_bot nmap</code> - Tra nhanh lệnh cài đặt và cách dùng công cụ ngay trong khung chat (inline mode).
 
 Hãy gõ <code>/</code> và chọn lệnh từ danh sách gợi ý, hoặc gõ trực tiếp lệnh bạn muốn!
 """ # Escaped placeholders in help text for consistency where appropriate
-    await update.message.reply_text(help_text_html, parse_mode=ParseMode.HTML)
\ No newline at end of file
+    await update.message.reply_text(help_text_html, parse_mode=ParseMode.HTML)
+
+async def inline_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    # Tra cứu tool / sub-command trực tiếp từ trie trong bộ nhớ, không gọi LLM.
+    query = update.inline_query.query
+    if tool_index_instance is None or not query.strip():
+        await update.inline_query.answer([], cache_time=10)
+        return
+
+    tool_index_instance.refresh_if_changed()
+    results = []
+    for i, entry in enumerate(tool_index_instance.search(query, limit=INLINE_RESULTS_LIMIT)):
+        usage = entry.usage_example or f"{entry.sub_command} --help"
+        if len(usage) > INLINE_USAGE_MAX_CHARS:
+            usage = usage[:INLINE_USAGE_MAX_CHARS] + "\n..."
+        message_html = (
+            f"<b>{_escape_html(entry.name)}</b> - <code>{_escape_html(entry.sub_command)}</code>\n"
+            f"Cài đặt: <code>{_escape_html(entry.how_to_install)}</code>\n\n"
+            f"<pre>{_escape_html(usage)}</pre>"
+        )
+        if entry.url:
+            message_html += f"\n<a href=\"{_escape_html(entry.url)}\">kali.org/tools</a>"
+        results.append(InlineQueryResultArticle(
+            id=str(i),
+            title=f"{entry.sub_command} ({entry.name})" if entry.sub_command != entry.name else entry.name,
+            description=entry.how_to_install,
+            input_message_content=InputTextMessageContent(message_html, parse_mode=ParseMode.HTML),
+        ))
+    await update.inline_query.answer(results, cache_time=300)
+
+async def index_admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not _is_admin(update):
+        await update.message.reply_text(_escape_html("Lệnh này chỉ dành cho admin."), parse_mode=ParseMode.HTML)
+        return
+    if kali_rag_service_instance is None:
+        await update.message.reply_text(_escape_html("KaliRAGService chưa được khởi tạo."), parse_mode=ParseMode.HTML)
+        return
+
+    action = context.args[0] if context.args else "status"
+    if action == "status":
+        versions = index_snapshots.list_versions()
+        lines = [f"Index đang phục vụ: <code>{_escape_html(kali_rag_service_instance.index_version or 'legacy')}</code>",
+                 f"CURRENT: <code>{_escape_html(index_snapshots.read_current_version() or '-')}</code>",
+                 f"PINNED: <code>{_escape_html(index_snapshots.read_pinned_version() or '-')}</code>",
+                 "Snapshots:"]
+        lines += [f"  • <code>{_escape_html(v)}</code>" for v in versions[-10:]] or ["  (không có)"]
+        await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.HTML)
+        return
+
+    if action == "reload":
+        swapped = await kali_rag_service_instance.reload_current_version()
+        message = "Đã chuyển sang index mới." if swapped else "Không có version mới (hoặc load thất bại, xem log)."
+    elif action == "rollback":
+        target = await kali_rag_service_instance.rollback()
+        message = f"Đã rollback về {target}." if target else "Không thể rollback (không có version trước đó hoặc load thất bại)."
+    elif action == "swap" and len(context.args) > 1:
+        try:
+            swapped = await kali_rag_service_instance.publish_and_swap(context.args[1], pinned=True)
+        except ValueError as e:
+            swapped, message = False, str(e)
+        else:
+            message = f"Đã chuyển sang {context.args[1]}." if swapped else "Load snapshot thất bại, xem log."
+    elif action == "unpin":
+        await asyncio.to_thread(index_snapshots.unpin)
+        message = "Đã bỏ pin, indexer sẽ publish snapshot mới ở lần chạy tiếp theo."
+    else:
+        message = "Cách dùng: /index_admin status | reload | rollback | swap <version> | unpin"
+    logger.info(f"index_admin '{' '.join(context.args)}' by user {update.effective_user.id}: {message}")
+    await update.message.reply_text(_escape_html(message), parse_mode=ParseMode.HTML)
+
+async def memory_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not _is_admin(update):
+        await update.message.reply_text(_escape_html("Lệnh này chỉ dành cho admin."), parse_mode=ParseMode.HTML)
+        return
+    services = {
+        "kali_rag": kali_rag_service_instance,
+        "translation": translation_service_instance,
+        "tool_index": tool_index_instance,
+    }
+    # Gemini client (dùng chung khi LOW_MEMORY_MODE=1) và answer cache chỉ đo một lần, không tính vào từng service.
+    shared = {
+        "kali_rag.llm": getattr(kali_rag_service_instance, "llm", None),
+        "translation.llm": getattr(translation_service_instance, "llm", None),
+        "kali_rag.answer_cache": getattr(kali_rag_service_instance, "answer_cache", None),
+        "translation.answer_cache": getattr(translation_service_instance, "answer_cache", None),
+    }
+    # Duyệt object graph có thể mất vài trăm ms, không chạy trên event loop.
+    report = await asyncio.to_thread(build_memory_report, services, shared)
+    await update.message.reply_text(f"<pre>{_escape_html(report)}</pre>", parse_mode=ParseMode.HTML)
+
@@ -0,0 +1,48 @@
+# telegram_kali_bot/cogs/fake_llm.py
+
+import asyncio
+import random
+
+
+class FakeLLMError(ConnectionError):
+    """Default injected fault; a ConnectionError so ResilientLLMCaller treats it as retryable."""
+
+
+class FakeLLM:
+    """
+    Stand-in for a Gemini-backed chain (ainvoke/arun) with injectable latency and faults,
+    used by the benchmark and load-test scripts instead of real API calls.
+    """
+
+    def __init__(self, response="<b>fake answer</b>",
+                 latency: float = 0.05,
+                 jitter: float = 0.0,
+                 tail_probability: float = 0.0,
+                 tail_latency: float = 0.0,
+                 fault_rate: float = 0.0,
+                 fault_factory=FakeLLMError,
+                 seed: int | None = None):
+        self.response = response
+        self.latency = latency
+        self.jitter = jitter
+        self.tail_probability = tail_probability
+        self.tail_latency = tail_latency
+        self.fault_rate = fault_rate
+        self.fault_factory = fault_factory
+        self.calls = 0
+        self._random = random.Random(seed)
+
+    def _next_latency(self) -> float:
+        if self.tail_probability and self._random.random() < self.tail_probability:
+            return self.tail_latency
+        return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+    async def ainvoke(self, input, *args, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self._next_latency())
+        if self.fault_rate and self._random.random() < self.fault_rate:
+            raise self.fault_factory("injected fake LLM fault")
+        return self.response(input) if callable(self.response) else self.response
+
+    async def arun(self, input, *args, **kwargs):
+        return await self.ainvoke(input, *args, **kwargs)
@@ -0,0 +1,141 @@
+# telegram_kali_bot/cogs/index_snapshots.py
+
+import json
+import os
+import time
+
+# Layout trong volume chroma_db:
+#   chroma_db/snapshots/<version>/chroma/                 Chroma persist dir (chỉ đọc sau khi publish)
+#   chroma_db/snapshots/<version>/kali_tools_data.json    dữ liệu nguồn dùng để build snapshot
+#   chroma_db/snapshots/<version>/canonical_answers.json  (tuỳ chọn) câu trả lời precompute
+#   chroma_db/snapshots/<version>/manifest.json
+#   chroma_db/CURRENT                                      tên version đang được phục vụ
+#   chroma_db/HISTORY                                      các version đã publish, mới nhất ở cuối (rollback = pop)
+#   chroma_db/PINNED                                       có nếu admin chọn version thủ công (rollback/swap);
+#                                                          build_index.py --if-changed không publish đè lên
+SNAPSHOTS_DIR = "./chroma_db/snapshots"
+CURRENT_VERSION_FILE = "./chroma_db/CURRENT"
+HISTORY_FILE = "./chroma_db/HISTORY"
+PINNED_FILE = "./chroma_db/PINNED"
+MANIFEST_FILE_NAME = "manifest.json"
+HISTORY_MAX_ENTRIES = 50
+
+
+def new_version_name() -> str:
+    # Sắp xếp theo thứ tự từ điển = theo thời gian build.
+    return time.strftime('%Y%m%dT%H%M%S')
+
+
+def snapshot_path(version: str) -> str:
+    return os.path.join(SNAPSHOTS_DIR, version)
+
+
+def snapshot_chroma_dir(version: str) -> str:
+    return os.path.join(snapshot_path(version), "chroma")
+
+
+def snapshot_data_file(version: str) -> str:
+    return os.path.join(snapshot_path(version), "kali_tools_data.json")
+
+
+def snapshot_canonical_answers_file(version: str) -> str:
+    return os.path.join(snapshot_path(version), "canonical_answers.json")
+
+
+def list_versions() -> list[str]:
+    """Complete snapshots (those with a manifest), oldest first."""
+    if not os.path.isdir(SNAPSHOTS_DIR):
+        return []
+    return sorted(
+        name for name in os.listdir(SNAPSHOTS_DIR)
+        if os.path.isfile(os.path.join(SNAPSHOTS_DIR, name, MANIFEST_FILE_NAME))
+    )
+
+
+def _read_text(path: str) -> str:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return ""
+
+
+def _write_text_atomic(path: str, text: str) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def read_current_version() -> str | None:
+    return _read_text(CURRENT_VERSION_FILE).strip() or None
+
+
+def read_pinned_version() -> str | None:
+    return _read_text(PINNED_FILE).strip() or None
+
+
+def unpin() -> None:
+    try:
+        os.remove(PINNED_FILE)
+    except FileNotFoundError:
+        pass
+
+
+def read_history() -> list[str]:
+    return _read_text(HISTORY_FILE).split()
+
+
+def _write_history(history: list[str]) -> None:
+    _write_text_atomic(HISTORY_FILE, "".join(f"{v}\n" for v in history[-HISTORY_MAX_ENTRIES:]))
+
+
+def read_manifest(version: str) -> dict:
+    with open(os.path.join(snapshot_path(version), MANIFEST_FILE_NAME), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_manifest(version: str, manifest: dict) -> None:
+    # Manifest được ghi cuối cùng: snapshot chỉ "tồn tại" (list_versions) khi đã build xong.
+    tmp_path = os.path.join(snapshot_path(version), MANIFEST_FILE_NAME + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, os.path.join(snapshot_path(version), MANIFEST_FILE_NAME))
+
+
+def publish_version(version: str, pinned: bool = False) -> None:
+    """Makes version the live one. pinned=True marks a manual choice that automatic publishes must not override."""
+    if version not in list_versions():
+        raise ValueError(f"Snapshot '{version}' does not exist or is incomplete.")
+    history = read_history()
+    if not history or history[-1] != version:
+        _write_history(history + [version])
+    _write_text_atomic(CURRENT_VERSION_FILE, version)
+    if pinned:
+        _write_text_atomic(PINNED_FILE, version)
+    else:
+        unpin()
+
+
+def previous_served_version(current: str | None) -> str | None:
+    """The version that was live before current (per HISTORY), skipping deleted snapshots."""
+    available = set(list_versions())
+    history = read_history()
+    while history and history[-1] == current:
+        history.pop()
+    while history and history[-1] not in available:
+        history.pop()
+    if history:
+        return history[-1]
+    # Snapshot publish trước khi có HISTORY: lùi theo thứ tự build.
+    older = [v for v in sorted(available) if current is None or v < current]
+    return older[-1] if older else None
+
+
+def record_rollback(version: str) -> None:
+    """Publishes version as the result of a rollback: pops the newer entries off HISTORY and pins it."""
+    history = read_history()
+    if version in history:
+        history = history[:len(history) - history[::-1].index(version) - 1]
+    _write_history(history)
+    publish_version(version, pinned=True)
@@ -6,6 +6,8 @@ import os
 import time
 import shutil
 import re 
+import hashlib
+import asyncio
 from langchain_chroma import Chroma 
 
 from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
@@ -14,26 +16,77 @@ from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.documents import Document
 import html 
+from cogs.resilience import ResilientLLMCaller
+from cogs.canonical_answers import CanonicalAnswerStore, append_request_log
+from cogs import index_snapshots
+from cogs.memory_profile import LOW_MEMORY_MODE, release_memory
+from cogs.logging_setup import log_payload
 
 logger = logging.getLogger(__name__)
 
 DATA_FILE = "data/kali_tools_data.json"
 CHROMA_DB_DIR = "./chroma_db"
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+INDEX_WATCH_INTERVAL_SECONDS = float(os.getenv("INDEX_WATCH_INTERVAL_SECONDS", "30"))
+COLLECTION_NAME = "kali_rag_collection"
+RETIRED_STATE_POLL_SECONDS = 1.0
 
 def _escape_html_internal(text: str) -> str:
     return html.escape(str(text))
 
+def _release_chroma_system(chroma_dir: str) -> None:
+    # chromadb giữ System (sqlite connection, HNSW segment đã load) trong cache toàn process, theo path:
+    # bỏ tham chiếu tới client/vectorstore không đóng được chúng. Chỉ gọi khi không còn request nào dùng path này.
+    try:
+        from chromadb.api.shared_system_client import SharedSystemClient
+    except ImportError:  # chromadb < 0.5.6
+        from chromadb.api.client import SharedSystemClient
+    system = SharedSystemClient._identifier_to_system.pop(chroma_dir, None)
+    if system is not None:
+        system.stop()
+
+class _IndexState:
+    # Mọi thứ phụ thuộc vào một phiên bản index. Được thay thế nguyên khối (một phép gán) khi hot-swap,
+    # request đang chạy giữ tham chiếu tới state cũ nên không bị ảnh hưởng.
+    __slots__ = ("version", "retriever", "rag_chain_phase1", "llm_chain_phase2", "canonical_answers", "chroma_dir", "in_flight")
+
+    def __init__(self, version=None, retriever=None, rag_chain_phase1=None, llm_chain_phase2=None, canonical_answers=None,
+                 chroma_dir=None):
+        self.version = version
+        self.retriever = retriever
+        self.rag_chain_phase1 = rag_chain_phase1
+        self.llm_chain_phase2 = llm_chain_phase2
+        self.canonical_answers = canonical_answers or CanonicalAnswerStore()
+        self.chroma_dir = chroma_dir
+        self.in_flight = 0  # số request ask_question đang dùng state này (chỉ thay đổi trên event loop)
+
 class KaliRAGService:
-    def __init__(self, google_api_key: str):
-        self.rag_chain_phase1 = None
-        self.llm_chain_phase2 = None
-        self.retriever = None
+    def __init__(self, google_api_key: str, read_only: bool = False, answer_cache=None, index_version: str | None = None):
+        self._state = _IndexState()
+        self._swap_lock = asyncio.Lock()
+        self._watcher_task = None
+        # State đã bị swap ra, chờ request đang chạy trên nó kết thúc để đóng Chroma System của nó.
+        self._retired_states: list[_IndexState] = []
+        self._release_tasks: set[asyncio.Task] = set()
+        # Được gọi sau mỗi lần swap thành công với version mới (vd: rebuild tool index cho inline mode).
+        self.swap_listeners = []
         self.llm = None
         self.google_api_key = google_api_key
+        # index_version: ép dùng một snapshot cụ thể (mặc định: version trong chroma_db/CURRENT nếu có).
+        self._pinned_version = index_version
+        # read_only: worker processes only open the index built by scripts/build_index.py, never (re)create it.
+        self.read_only = read_only
+        # Optional QueueBackend (cogs/queue_backend.py) used as an answer cache shared between workers.
+        self.answer_cache = answer_cache
+        # Timeouts, retries, hedging and circuit breaker around every Gemini call of this service.
+        self.llm_caller = ResilientLLMCaller.from_env("kali_rag")
 
         if self.google_api_key:
             try:
                 self._initialize_chains() 
+                if LOW_MEMORY_MODE:
+                    # List Document tạm thời (khi build index legacy) đã hết tham chiếu ở đây; trả heap về OS.
+                    release_memory()
                 if self.rag_chain_phase1 and self.llm_chain_phase2:
                     logger.info("KaliRAGService initialized successfully with Phase 1 & 2 chains.")
                 else:
@@ -43,7 +96,29 @@ class KaliRAGService:
         else:
             logger.warning("GOOGLE_API_KEY not provided. RAG feature will be unavailable.")
 
-    def _load_and_prepare_data(self, filepath: str) -> list[Document]:
+    @property
+    def index_version(self) -> str | None:
+        return self._state.version
+
+    @property
+    def retriever(self):
+        return self._state.retriever
+
+    @property
+    def rag_chain_phase1(self):
+        return self._state.rag_chain_phase1
+
+    @property
+    def llm_chain_phase2(self):
+        return self._state.llm_chain_phase2
+
+    @property
+    def canonical_answers(self) -> CanonicalAnswerStore:
+        # Câu trả lời đã được sinh sẵn bởi scripts/precompute_answers.py cho câu hỏi dạng "cách dùng <tool>".
+        return self._state.canonical_answers
+
+    @staticmethod
+    def _load_and_prepare_data(filepath: str) -> list[Document]:
         logger.info(f"[{time.strftime('%H:%M:%S')}] Loading data for RAG from {filepath}...")
         try:
             with open(filepath, 'r', encoding='utf-8') as f:
@@ -91,6 +166,13 @@ class KaliRAGService:
         return documents
 
     def _initialize_chains(self):
+        version = self._pinned_version or index_snapshots.read_current_version()
+        if version:
+            state = self._load_snapshot(version)
+            if state is not None:
+                self._state = state
+            return
+
         documents = self._load_and_prepare_data(DATA_FILE)
         if not documents:
             logger.error("RAG Initialization failed: No documents available for RAG.")
@@ -101,9 +183,14 @@ class KaliRAGService:
         
         vectorstore = None
         force_recreate_db = False
-        collection_name = "kali_rag_collection"
+        collection_name = COLLECTION_NAME
 
-        if os.path.exists(CHROMA_DB_DIR):
+        if self.read_only:
+            vectorstore = self._open_existing_vectorstore(CHROMA_DB_DIR, collection_name, embeddings)
+            if vectorstore is None:
+                logger.error(f"[{time.strftime('%H:%M:%S')}] Read-only mode: no usable Chroma collection '{collection_name}' at {CHROMA_DB_DIR}. Run scripts/build_index.py first.")
+                return
+        elif os.path.exists(CHROMA_DB_DIR):
             try:
                 logger.info(f"[{time.strftime('%H:%M:%S')}] Attempting to load or check existing Chroma DB from {CHROMA_DB_DIR}.")
                 import chromadb
@@ -129,6 +216,10 @@ class KaliRAGService:
 
         if force_recreate_db:
             logger.warning(f"[{time.strftime('%H:%M:%S')}] Forcing recreation of Chroma DB at {CHROMA_DB_DIR}.")
+            if index_snapshots.list_versions():
+                # Snapshots dùng chung volume chroma_db, không được xoá cả thư mục.
+                logger.error(f"[{time.strftime('%H:%M:%S')}] Refusing to remove {CHROMA_DB_DIR}: it contains index snapshots. Publish one with scripts/build_index.py --publish <version>.")
+                return
             if os.path.exists(CHROMA_DB_DIR):
                 try:
                     shutil.rmtree(CHROMA_DB_DIR)
@@ -155,8 +246,32 @@ class KaliRAGService:
             logger.error(f"[{time.strftime('%H:%M:%S')}] Vectorstore is still None. RAG will be unavailable.")
             return
 
-        self.retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
-        self.llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash-latest", temperature=0.2, google_api_key=self.google_api_key) # Slightly lower temp
+        self._state = self._build_state(None, vectorstore, CanonicalAnswerStore.load(), CHROMA_DB_DIR)
+
+    def _load_snapshot(self, version: str) -> _IndexState | None:
+        # Snapshot được build sẵn bởi scripts/build_index.py --snapshot, luôn chỉ mở ở chế độ đọc.
+        logger.info(f"[{time.strftime('%H:%M:%S')}] Loading index snapshot '{version}'...")
+        if version not in index_snapshots.list_versions():
+            logger.error(f"[{time.strftime('%H:%M:%S')}] Index snapshot '{version}' does not exist or is incomplete.")
+            return None
+        embeddings = GoogleGenerativeAIEmbeddings(google_api_key=self.google_api_key, model="models/embedding-001")
+        chroma_dir = index_snapshots.snapshot_chroma_dir(version)
+        vectorstore = self._open_existing_vectorstore(chroma_dir, COLLECTION_NAME, embeddings)
+        if vectorstore is None:
+            logger.error(f"[{time.strftime('%H:%M:%S')}] Index snapshot '{version}' has no usable Chroma collection.")
+            return None
+        canonical_answers = CanonicalAnswerStore.load(index_snapshots.snapshot_canonical_answers_file(version))
+        return self._build_state(version, vectorstore, canonical_answers, chroma_dir)
+
+    def get_llm(self):
+        if self.llm is None:
+            self.llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash-latest", temperature=0.2, google_api_key=self.google_api_key, # Slightly lower temp
+                                              **self.llm_caller.client_kwargs())
+        return self.llm
+
+    def _build_state(self, version, vectorstore, canonical_answers: CanonicalAnswerStore, chroma_dir: str) -> _IndexState:
+        retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
+        self.get_llm()
         
         html_template_phase1 = """Bạn là một trợ lý tìm kiếm thông tin.
 Nhiệm vụ của bạn là trả lời câu hỏi của người dùng DỰA HOÀN TOÀN vào 'Ngữ cảnh công cụ' được cung cấp.
@@ -177,8 +292,8 @@ Câu trả lời (HTML hoặc chuỗi [NO_CONTEXT_DATA_FOUND]):
 """
         prompt_phase1 = ChatPromptTemplate.from_template(html_template_phase1)
         
-        self.rag_chain_phase1 = (
-            {"context": self.retriever, "question": RunnablePassthrough()}
+        rag_chain_phase1 = (
+            {"context": retriever, "question": RunnablePassthrough()}
             | prompt_phase1
             | self.llm
             | StrOutputParser()
@@ -224,42 +339,192 @@ Câu trả lời (TUYỆT ĐỐI LÀ HTML tiếng Việt, tuân thủ MỌI quy
 """
         prompt_phase2 = ChatPromptTemplate.from_template(html_template_phase2)
         
-        self.llm_chain_phase2 = (
+        llm_chain_phase2 = (
             prompt_phase2 
             | self.llm
             | StrOutputParser()
         )
         logger.info("LLM Chain Phase 2 initialized.")
+        return _IndexState(version, retriever, rag_chain_phase1, llm_chain_phase2, canonical_answers, chroma_dir)
 
+    async def swap_to_version(self, version: str) -> bool:
+        # Load ở thread nền (mở Chroma, dựng chain), sau đó swap bằng một phép gán duy nhất.
+        async with self._swap_lock:
+            if version == self._state.version:
+                return True
+            state = await asyncio.to_thread(self._load_snapshot, version)
+            if state is None:
+                return False
+            previous_state, self._state = self._state, state
+            self._retire_state(previous_state)
+            logger.info(f"[{time.strftime('%H:%M:%S')}] Swapped RAG index to version '{version}' (previous: '{previous_state.version}').")
+        for listener in self.swap_listeners:
+            try:
+                listener(version)
+            except Exception as e:
+                logger.error(f"Index swap listener failed: {e}", exc_info=True)
+        return True
 
-    async def ask_question(self, query: str) -> str:
-        no_context_marker = "[NO_CONTEXT_DATA_FOUND]"
+    def _retire_state(self, state: _IndexState) -> None:
+        # Không giữ lại state cũ, nhưng Chroma System của nó nằm trong cache toàn process của chromadb:
+        # phải đóng tường minh khi mọi request đang chạy trên snapshot đó kết thúc.
+        if state.chroma_dir is None:
+            return
+        self._retired_states.append(state)
+        task = asyncio.get_running_loop().create_task(self._release_retired_state(state))
+        self._release_tasks.add(task)
+        task.add_done_callback(self._release_tasks.discard)
+
+    async def _release_retired_state(self, state: _IndexState) -> None:
+        chroma_dir = state.chroma_dir
+        while any(s.in_flight for s in self._retired_states if s.chroma_dir == chroma_dir):
+            await asyncio.sleep(RETIRED_STATE_POLL_SECONDS)
+        async with self._swap_lock:
+            if state not in self._retired_states:
+                return  # một task khác đã xử lý snapshot này
+            self._retired_states = [s for s in self._retired_states if s.chroma_dir != chroma_dir]
+            if self._state.chroma_dir == chroma_dir:
+                return  # đã swap về lại chính snapshot này, System đang được dùng
+            try:
+                await asyncio.to_thread(_release_chroma_system, chroma_dir)
+                logger.info(f"[{time.strftime('%H:%M:%S')}] Released Chroma client of retired index at {chroma_dir}.")
+            except Exception as e:
+                logger.error(f"Failed to release Chroma client at {chroma_dir}: {e}", exc_info=True)
+
+    async def reload_current_version(self) -> bool:
+        version = index_snapshots.read_current_version()
+        if not version or version == self._state.version:
+            return False
+        return await self.swap_to_version(version)
+
+    async def publish_and_swap(self, version: str, pinned: bool = False) -> bool:
+        # Ghi CURRENT để mọi worker khác cũng chuyển theo ở lần kiểm tra tiếp theo.
+        await asyncio.to_thread(index_snapshots.publish_version, version, pinned)
+        return await self.swap_to_version(version)
+
+    async def rollback(self) -> str | None:
+        # Quay về version đã phục vụ trước đó (theo HISTORY) và pin lại để indexer không publish đè.
+        # Ghi CURRENT + PINNED trước rồi mới swap (như publish_and_swap): nếu ngược lại, watcher chạy xen giữa
+        # sẽ thấy CURRENT cũ và swap ngay về version mới hơn.
+        target = await asyncio.to_thread(index_snapshots.previous_served_version, self._state.version)
+        if target is None:
+            return None
+        await asyncio.to_thread(index_snapshots.record_rollback, target)
+        if not await self.swap_to_version(target):
+            logger.error(f"Rollback to '{target}' was published but the snapshot could not be loaded in this process.")
+            return None
+        return target
+
+    async def _watch_index_versions(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.reload_current_version()
+            except Exception as e:
+                logger.error(f"Index version watcher failed: {e}", exc_info=True)
+
+    def start_index_watcher(self, interval: float = INDEX_WATCH_INTERVAL_SECONDS) -> None:
+        # Phải gọi từ bên trong event loop đang chạy (post_init của Application / worker).
+        if self._watcher_task is None and self._pinned_version is None:
+            self._watcher_task = asyncio.get_running_loop().create_task(self._watch_index_versions(interval))
+            logger.info(f"Watching {index_snapshots.CURRENT_VERSION_FILE} for new index versions every {interval:.0f}s.")
+
+
+    def _open_existing_vectorstore(self, chroma_dir: str, collection_name: str, embeddings):
+        if not os.path.exists(chroma_dir):
+            return None
+        try:
+            import chromadb
+            client = chromadb.PersistentClient(path=chroma_dir)
+            collection = client.get_collection(name=collection_name)
+            if collection.count() == 0:
+                return None
+            logger.info(f"[{time.strftime('%H:%M:%S')}] Opened existing Chroma collection '{collection_name}' with {collection.count()} documents (read-only).")
+            return Chroma(client=client, collection_name=collection_name, embedding_function=embeddings, persist_directory=chroma_dir)
+        except Exception as e:
+            logger.error(f"[{time.strftime('%H:%M:%S')}] Failed to open existing Chroma DB at {chroma_dir}: {e}", exc_info=True)
+            return None
+
+    def memory_components(self) -> dict:
+        # Cho /memory: chỉ dữ liệu riêng của service; LLM client và answer cache được đo riêng (dùng chung).
+        state = self._state
+        components = {
+            f"index '{state.version or 'legacy'}' (retriever + chains)": (state.retriever, state.rag_chain_phase1, state.llm_chain_phase2),
+            f"canonical answers ({len(state.canonical_answers.entries)})": state.canonical_answers.entries,
+        }
+        if self._retired_states:
+            components[f"retired index states ({len(self._retired_states)})"] = self._retired_states
+        return components
 
-        if not self.rag_chain_phase1:
+    @staticmethod
+    def _answer_cache_key(index_version: str | None, query: str) -> str:
+        # Version nằm trong key: câu trả lời của index cũ không được phục vụ sau khi swap.
+        normalized_query = " ".join(query.lower().split())
+        return f"ask_kali:{index_version or 'legacy'}:" + hashlib.sha256(normalized_query.encode('utf-8')).hexdigest()
+
+    async def ask_question(self, query: str, use_canonical: bool = True) -> str:
+        # Giữ state hiện tại cho toàn bộ request, kể cả khi index bị swap giữa chừng.
+        state = self._state
+        state.in_flight += 1
+        try:
+            return await self._ask_with_state(state, query, use_canonical)
+        finally:
+            state.in_flight -= 1
+
+    async def _ask_with_state(self, state: _IndexState, query: str, use_canonical: bool) -> str:
+        if use_canonical:
+            append_request_log(query)
+            canonical_answer = state.canonical_answers.lookup(query)
+            if canonical_answer is not None:
+                logger.info("Serving precomputed canonical answer.")
+                return canonical_answer
+
+        if not state.rag_chain_phase1:
             logger.error("RAG Chain Phase 1 is not initialized in ask_question.")
             return _escape_html_internal("Lỗi: RAG Chain Pha 1 chưa được khởi tạo.")
 
+        if self.answer_cache is None:
+            return await self._answer_question(state, query)
+
+        cache_key = self._answer_cache_key(state.version, query)
+        try:
+            cached_answer = await self.answer_cache.cache_get(cache_key)
+        except Exception as e:
+            logger.warning(f"Answer cache lookup failed, continuing without cache: {e}")
+            cached_answer = None
+        if cached_answer is not None:
+            logger.info("Answer cache hit for ask_question.")
+            return cached_answer
+
+        answer = await self._answer_question(state, query)
+        try:
+            await self.answer_cache.cache_set(cache_key, answer, ANSWER_CACHE_TTL_SECONDS)
+        except Exception as e:
+            logger.warning(f"Failed to store answer in cache: {e}")
+        return answer
+
+    async def _answer_question(self, state: _IndexState, query: str) -> str:
+        no_context_marker = "[NO_CONTEXT_DATA_FOUND]"
+
         logger.info(f"Phase 1 RAG: Querying for '{_escape_html_internal(query)}'")
-        response_phase1 = await self.rag_chain_phase1.ainvoke(query)
+        response_phase1 = await self.llm_caller.call(lambda: state.rag_chain_phase1.ainvoke(query))
         response_phase1 = response_phase1.strip()
         
-        log_response_preview_p1 = response_phase1.replace('\n', ' ')[:200]
-        logger.info(f"Phase 1 RAG: Response: '{log_response_preview_p1}...'") 
+        log_payload(logger, "Phase 1 RAG: Response", response_phase1)
 
         if response_phase1 != no_context_marker:
             logger.info("Phase 1 RAG: Answer found in context.")
             return response_phase1
         else:
             logger.info("Phase 1 RAG: No context found. Proceeding to Phase 2 (LLM only).")
-            if not self.llm_chain_phase2:
+            if not state.llm_chain_phase2:
                 logger.error("LLM Chain Phase 2 is not initialized in ask_question.")
                 return _escape_html_internal("Lỗi: LLM Chain Pha 2 chưa được khởi tạo.")
             
             logger.info(f"Phase 2 LLM: Querying for '{_escape_html_internal(query)}'") 
-            response_phase2 = await self.llm_chain_phase2.ainvoke({"question": query})
+            response_phase2 = await self.llm_caller.call(lambda: state.llm_chain_phase2.ainvoke({"question": query}))
             response_phase2_stripped = response_phase2.strip()
             
-            log_response_preview_p2 = response_phase2_stripped.replace('\n', ' ')[:300]
-            logger.info(f"Phase 2 LLM: Raw Response: '{log_response_preview_p2}...'") 
+            log_payload(logger, "Phase 2 LLM: Raw Response", response_phase2_stripped)
             
             return response_phase2_stripped
\ No newline at end of file
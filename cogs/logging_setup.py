@@ -0,0 +1,179 @@
+# telegram_kali_bot/cogs/logging_setup.py
+
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+
+# LOG_FORMAT=json|text, LOG_LEVEL=INFO|DEBUG|...
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Tỉ lệ request được log toàn bộ payload lớn (HTML từ LLM...). Lỗi thì luôn log đầy đủ.
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+SLOW_REQUEST_THRESHOLD_SECONDS = float(os.getenv("SLOW_REQUEST_THRESHOLD_SECONDS", "5"))
+TEXT_LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
+
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+# Quyết định sample payload một lần cho cả request (cùng lúc với request_id): body thô và body đã bleach
+# của cùng một request được log cùng nhau. None = ngoài request (script...), mỗi lần gọi tự quyết định.
+payload_sampled_var: contextvars.ContextVar[bool | None] = contextvars.ContextVar("payload_sampled", default=None)
+
+_listener: QueueListener | None = None
+
+
+class _RequestIdFilter(logging.Filter):
+    # Chạy trong thread gọi logger (trước khi vào queue) nên đọc được contextvar của request.
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        return True
+
+
+class _StructuredQueueHandler(QueueHandler):
+    # Giống QueueHandler.prepare nhưng giữ traceback ở exc_text thay vì nối vào message.
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            text += " " + json.dumps(fields, ensure_ascii=False, default=str)
+        return text
+
+
+def setup_logging(stream=None) -> None:
+    """Root logger -> in-memory queue -> background listener thread -> stream. Only the enqueue happens on the caller."""
+    global _listener
+    if _listener is not None:
+        return
+
+    output_handler = logging.StreamHandler(stream or sys.stderr)
+    output_handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter(TEXT_LOG_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(_RequestIdFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+    # httpx log mỗi request tới Telegram API ở INFO, quá ồn khi có tải.
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    _listener = QueueListener(log_queue, output_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()  # flush mọi record còn trong queue
+        _listener = None
+
+
+def queued_handler(handler: logging.Handler) -> QueueHandler:
+    """Wraps handler so that its I/O runs on its own background listener thread (flushed at exit)."""
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+    atexit.register(listener.stop)
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.listener = listener
+    return queue_handler
+
+
+def _sample_payloads() -> bool:
+    return bool(LOG_PAYLOAD_SAMPLE_RATE) and random.random() < LOG_PAYLOAD_SAMPLE_RATE
+
+
+def new_request_id(request_id: str | None = None, sample_payloads: bool | None = None) -> str:
+    """Sets the request id and draws the payload sampling decision for everything logged by this request."""
+    request_id = request_id or os.urandom(4).hex()
+    request_id_var.set(request_id)
+    payload_sampled_var.set(_sample_payloads() if sample_payloads is None else sample_payloads)
+    return request_id
+
+
+def log_payload(logger: logging.Logger, label: str, payload: str, error: bool = False, **fields) -> None:
+    """Large bodies are logged in full only for errors or sampled requests (LOG_PAYLOAD_SAMPLE_RATE, decided once per
+    request in new_request_id); otherwise just their size at DEBUG."""
+    sampled = payload_sampled_var.get()
+    if sampled is None:
+        sampled = _sample_payloads()
+    if error:
+        logger.error(label, extra={"fields": {**fields, "payload": payload}})
+    elif sampled:
+        logger.info(label, extra={"fields": {**fields, "payload": payload, "sampled": True}})
+    elif logger.isEnabledFor(logging.DEBUG):
+        logger.debug(label, extra={"fields": {**fields, "payload_chars": len(payload)}})
+
+
+class RequestTimer:
+    """Per-stage timings of one request; requests slower than SLOW_REQUEST_THRESHOLD_SECONDS go to the slow-request log."""
+
+    slow_logger = logging.getLogger("slow_requests")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.stages: dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, stage_name: str):
+        stage_started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[stage_name] = self.stages.get(stage_name, 0.0) + time.perf_counter() - stage_started
+
+    def finish(self, status: str = "ok") -> float:
+        total = time.perf_counter() - self.started
+        fields = {
+            "request": self.name,
+            "status": status,
+            "total_ms": round(total * 1000, 1),
+            "stages_ms": {name: round(seconds * 1000, 1) for name, seconds in self.stages.items()},
+        }
+        if total >= SLOW_REQUEST_THRESHOLD_SECONDS:
+            self.slow_logger.warning(f"Slow request: {self.name} took {total:.2f}s", extra={"fields": fields})
+        elif self.slow_logger.isEnabledFor(logging.DEBUG):
+            self.slow_logger.debug(f"{self.name} took {total:.3f}s", extra={"fields": fields})
+        return total
@@ -0,0 +1,143 @@
+# telegram_kali_bot/cogs/memory_profile.py
+
+import asyncio
+import concurrent.futures
+import ctypes
+import gc
+import logging
+import os
+import sys
+import threading
+import tracemalloc
+import types
+
+logger = logging.getLogger(__name__)
+
+# MEMORY_PROFILING=1: bật tracemalloc từ lúc khởi động (tốn thêm CPU/RAM, chỉ dùng khi cần điều tra).
+MEMORY_PROFILING = os.getenv("MEMORY_PROFILING", "0") == "1"
+# LOW_MEMORY_MODE=1: rút gọn dữ liệu inline, trả heap về OS sau khi build index, dùng chung 1 LLM client.
+LOW_MEMORY_MODE = os.getenv("LOW_MEMORY_MODE", "0") == "1"
+TRACEMALLOC_FRAMES = 1
+
+# Không đi sâu vào các object dùng chung toàn process (module, class, hàm) khi đo footprint của service.
+# Event loop, task/future, lock, thread, executor, logger: từ đó đến được gần như mọi thứ đang sống trong process
+# (Application, các service khác...), một asyncio.Lock hay một Task là đủ để kéo cả loop vào số đo.
+_SHARED_TYPES = (
+    types.ModuleType, type, types.FunctionType, types.BuiltinFunctionType, types.MethodType, types.CodeType,
+    asyncio.AbstractEventLoop, asyncio.Future, asyncio.Lock, asyncio.Event, asyncio.Condition, asyncio.Semaphore,
+    threading.Thread, type(threading.Lock()), type(threading.RLock()), threading.Condition, threading.Event,
+    concurrent.futures.Executor, logging.Logger,
+)
+
+
+def start_tracing_if_enabled() -> None:
+    if MEMORY_PROFILING and not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        logger.info("tracemalloc started (MEMORY_PROFILING=1).")
+
+
+def release_memory() -> None:
+    gc.collect()
+    # glibc giữ lại vùng heap đã free; malloc_trim trả nó về OS để RSS thực sự giảm.
+    if sys.platform.startswith("linux"):
+        try:
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+        except (OSError, AttributeError):
+            pass
+
+
+def current_rss_bytes() -> int:
+    try:
+        with open("/proc/self/status", 'r') as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return peak_rss_bytes()
+
+
+def peak_rss_bytes() -> int:
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # macOS: bytes, Linux: KiB
+
+
+def deep_sizeof(obj, max_objects: int = 200_000, exclude_ids: frozenset = frozenset()) -> tuple[int, int]:
+    """Approximate retained size of obj: (bytes, objects visited). Objects whose id is in exclude_ids are not entered."""
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack and len(seen) < max_objects:
+        current = stack.pop()
+        if id(current) in seen or id(current) in exclude_ids or isinstance(current, _SHARED_TYPES):
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current, 0)
+        stack.extend(gc.get_referents(current))
+    return total, len(seen)
+
+
+def _format_bytes(num_bytes: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if abs(num_bytes) < 1024:
+            return f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} GiB"
+
+
+def build_memory_report(services: dict, shared: dict | None = None, top_n: int = 10) -> str:
+    """services: name -> service; each service's memory_components() (label -> object) is measured, not the service
+    itself. shared: label -> object used by several services (LLM client, answer cache), measured once and excluded
+    from every service."""
+    lines = [
+        f"RSS: {_format_bytes(current_rss_bytes())} (peak {_format_bytes(peak_rss_bytes())})",
+        f"Low-memory mode: {'on' if LOW_MEMORY_MODE else 'off'}",
+        f"Loaded modules: {len(sys.modules)}",
+        "",
+        "Per-service footprint (approx.):",
+    ]
+    shared_labels: dict[int, list[str]] = {}
+    shared_objects: dict[int, object] = {}
+    for label, obj in (shared or {}).items():
+        if obj is not None:
+            shared_labels.setdefault(id(obj), []).append(label)
+            shared_objects[id(obj)] = obj
+    exclude_ids = frozenset(shared_objects)
+
+    for name, service in services.items():
+        if service is None:
+            lines.append(f"  {name}: not initialized")
+            continue
+        components = service.memory_components() if hasattr(service, "memory_components") else {"": service}
+        for label, component in components.items():
+            size, count = deep_sizeof(component, exclude_ids=exclude_ids)
+            lines.append(f"  {name}{' ' + label if label else ''}: {_format_bytes(size)} in {count} objects")
+    if shared_objects:
+        lines.append("Shared (counted once):")
+        for obj_id, obj in shared_objects.items():
+            size, count = deep_sizeof(obj, exclude_ids=exclude_ids - {obj_id})
+            lines.append(f"  {' = '.join(shared_labels[obj_id])}: {_format_bytes(size)} in {count} objects")
+
+    lines.append("")
+    if not tracemalloc.is_tracing():
+        lines.append("tracemalloc is off (set MEMORY_PROFILING=1 to see top allocators).")
+        return "\n".join(lines)
+
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    ))
+    traced_current, traced_peak = tracemalloc.get_traced_memory()
+    lines.append(f"Traced: {_format_bytes(traced_current)} (peak {_format_bytes(traced_peak)})")
+    lines.append(f"Top {top_n} allocators:")
+    for stat in snapshot.statistics('lineno')[:top_n]:
+        frame = stat.traceback[0]
+        filename = frame.filename
+        for path in sys.path:
+            if path and filename.startswith(path):
+                filename = os.path.relpath(filename, path)
+                break
+        lines.append(f"  {_format_bytes(stat.size):>10}  {stat.count:>7} blocks  {filename}:{frame.lineno}")
+    return "\n".join(lines)
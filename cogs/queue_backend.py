@@ -0,0 +1,233 @@
+# telegram_kali_bot/cogs/queue_backend.py
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# memory:// (single process, tests), sqlite:///path/to/file.db (multi-process on one host), redis://host:6379/0 (production)
+DEFAULT_QUEUE_BACKEND_URL = "memory://"
+UPDATES_QUEUE_NAME = "telegram_updates"
+# InMemoryQueueBackend: số key cache tối đa, vượt quá thì bỏ key cũ nhất.
+MEMORY_CACHE_MAX_ENTRIES = int(os.getenv("MEMORY_CACHE_MAX_ENTRIES", "10000"))
+# SQLiteQueueBackend: xoá các dòng cache hết hạn sau mỗi N lần cache_set.
+SQLITE_CACHE_PURGE_EVERY = 500
+
+
+class QueueBackend:
+    """Shared job queue + key/value cache used by the ingress and the worker processes."""
+
+    async def enqueue(self, queue_name: str, payload: str) -> None:
+        raise NotImplementedError
+
+    async def dequeue(self, queue_name: str, timeout: float = 1.0) -> str | None:
+        """Removes and returns the oldest payload (None on timeout). At-most-once: there is no ack, a payload
+        dequeued by a process that dies before handling it is lost."""
+        raise NotImplementedError
+
+    async def queue_size(self, queue_name: str) -> int:
+        raise NotImplementedError
+
+    async def cache_get(self, key: str) -> str | None:
+        raise NotImplementedError
+
+    async def cache_set(self, key: str, value: str, ttl_seconds: int | None = None) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemoryQueueBackend(QueueBackend):
+    def __init__(self, max_cache_entries: int = MEMORY_CACHE_MAX_ENTRIES):
+        self._queues: dict[str, asyncio.Queue] = {}
+        # dict giữ thứ tự chèn: key đầu tiên là key được set lâu nhất.
+        self._cache: dict[str, tuple[str, float | None]] = {}
+        self.max_cache_entries = max_cache_entries
+
+    def _queue(self, queue_name: str) -> asyncio.Queue:
+        if queue_name not in self._queues:
+            self._queues[queue_name] = asyncio.Queue()
+        return self._queues[queue_name]
+
+    async def enqueue(self, queue_name: str, payload: str) -> None:
+        await self._queue(queue_name).put(payload)
+
+    async def dequeue(self, queue_name: str, timeout: float = 1.0) -> str | None:
+        try:
+            return await asyncio.wait_for(self._queue(queue_name).get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def queue_size(self, queue_name: str) -> int:
+        return self._queue(queue_name).qsize()
+
+    async def cache_get(self, key: str) -> str | None:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at < time.time():
+            self._cache.pop(key, None)
+            return None
+        return value
+
+    async def cache_set(self, key: str, value: str, ttl_seconds: int | None = None) -> None:
+        expires_at = time.time() + ttl_seconds if ttl_seconds else None
+        self._cache.pop(key, None)
+        self._cache[key] = (value, expires_at)
+        if len(self._cache) > self.max_cache_entries:
+            self._evict()
+
+    def _evict(self) -> None:
+        now = time.time()
+        for key in [k for k, (_, expires_at) in self._cache.items() if expires_at is not None and expires_at < now]:
+            del self._cache[key]
+        while len(self._cache) > self.max_cache_entries:
+            del self._cache[next(iter(self._cache))]
+
+
+class SQLiteQueueBackend(QueueBackend):
+    POLL_INTERVAL = 0.05  # seconds between polls while the queue is empty
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._sets_since_purge = 0
+        # isolation_level=None: we manage transactions ourselves (BEGIN IMMEDIATE for dequeue).
+        self._conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, queue TEXT NOT NULL, payload TEXT NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue_idx ON jobs (queue, id)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+
+    def _enqueue_sync(self, queue_name: str, payload: str) -> None:
+        with self._lock:
+            self._conn.execute("INSERT INTO jobs (queue, payload) VALUES (?, ?)", (queue_name, payload))
+
+    def _try_dequeue_sync(self, queue_name: str) -> str | None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id, payload FROM jobs WHERE queue = ? ORDER BY id LIMIT 1", (queue_name,)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute("DELETE FROM jobs WHERE id = ?", (row[0],))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row[1] if row is not None else None
+
+    def _queue_size_sync(self, queue_name: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE queue = ?", (queue_name,)).fetchone()[0]
+
+    def _cache_get_sync(self, key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at < time.time():
+                self._conn.execute("DELETE FROM cache WHERE key = ? AND expires_at = ?", (key, expires_at))
+                return None
+        return value
+
+    def _cache_set_sync(self, key: str, value: str, ttl_seconds: int | None) -> None:
+        now = time.time()
+        expires_at = now + ttl_seconds if ttl_seconds else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)", (key, value, expires_at)
+            )
+            # Key hết hạn mà không ai đọc lại sẽ không bị xoá ở cache_get: dọn định kỳ.
+            self._sets_since_purge += 1
+            if self._sets_since_purge >= SQLITE_CACHE_PURGE_EVERY:
+                self._sets_since_purge = 0
+                self._conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?", (now,))
+
+    async def enqueue(self, queue_name: str, payload: str) -> None:
+        await asyncio.to_thread(self._enqueue_sync, queue_name, payload)
+
+    async def dequeue(self, queue_name: str, timeout: float = 1.0) -> str | None:
+        deadline = time.monotonic() + timeout
+        while True:
+            payload = await asyncio.to_thread(self._try_dequeue_sync, queue_name)
+            if payload is not None:
+                return payload
+            if time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(self.POLL_INTERVAL)
+
+    async def queue_size(self, queue_name: str) -> int:
+        return await asyncio.to_thread(self._queue_size_sync, queue_name)
+
+    async def cache_get(self, key: str) -> str | None:
+        return await asyncio.to_thread(self._cache_get_sync, key)
+
+    async def cache_set(self, key: str, value: str, ttl_seconds: int | None = None) -> None:
+        await asyncio.to_thread(self._cache_set_sync, key, value, ttl_seconds)
+
+    async def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class RedisQueueBackend(QueueBackend):
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis_asyncio
+        except ImportError as e:
+            raise RuntimeError("Redis backend requested but the 'redis' package is not installed.") from e
+        self._redis = redis_asyncio.from_url(url, decode_responses=True)
+
+    async def enqueue(self, queue_name: str, payload: str) -> None:
+        await self._redis.lpush(queue_name, payload)
+
+    async def dequeue(self, queue_name: str, timeout: float = 1.0) -> str | None:
+        # BRPOP only accepts whole seconds on older servers; never pass 0 (= block forever).
+        result = await self._redis.brpop(queue_name, timeout=max(1, int(timeout)))
+        if result is None:
+            return None
+        return result[1]
+
+    async def queue_size(self, queue_name: str) -> int:
+        return await self._redis.llen(queue_name)
+
+    async def cache_get(self, key: str) -> str | None:
+        return await self._redis.get(key)
+
+    async def cache_set(self, key: str, value: str, ttl_seconds: int | None = None) -> None:
+        await self._redis.set(key, value, ex=ttl_seconds or None)
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+def create_queue_backend(url: str | None = None) -> QueueBackend:
+    url = url or os.getenv("QUEUE_BACKEND_URL", DEFAULT_QUEUE_BACKEND_URL)
+    if url.startswith("memory://"):
+        logger.info("Using in-memory queue backend (single process only).")
+        return InMemoryQueueBackend()
+    if url.startswith("sqlite:///"):
+        db_path = url[len("sqlite:///"):]
+        logger.info(f"Using SQLite queue backend at {db_path}.")
+        return SQLiteQueueBackend(db_path)
+    if url.startswith(("redis://", "rediss://")):
+        logger.info("Using Redis queue backend.")
+        return RedisQueueBackend(url)
+    raise ValueError(f"Unsupported QUEUE_BACKEND_URL: {url}")
@@ -0,0 +1,198 @@
+# telegram_kali_bot/cogs/resilience.py
+
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+try:
+    from google.api_core import exceptions as google_exceptions
+    _RETRYABLE_GOOGLE_ERRORS = (
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.ResourceExhausted,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.InternalServerError,
+        google_exceptions.TooManyRequests,
+    )
+except ImportError:
+    _RETRYABLE_GOOGLE_ERRORS = ()
+
+RETRYABLE_ERRORS = (asyncio.TimeoutError, ConnectionError) + _RETRYABLE_GOOGLE_ERRORS
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the upstream while its circuit breaker is open."""
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+
+    def allow_request(self) -> bool:
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            logger.info(f"Circuit breaker '{self.name}' half-open, probing upstream.")
+        if self.state == self.HALF_OPEN:
+            # Let a single probe through; its outcome decides whether the circuit closes again.
+            # Everyone else keeps failing fast until then.
+            if self.probe_in_flight:
+                return False
+            self.probe_in_flight = True
+        return True
+
+    def release_probe(self) -> None:
+        # Probe ended without a verdict (cancelled, non-retryable error): let the next caller probe.
+        self.probe_in_flight = False
+
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            logger.info(f"Circuit breaker '{self.name}' closed again.")
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self.probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"Circuit breaker '{self.name}' opened after {self.consecutive_failures} consecutive failures.")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class ResilientLLMCaller:
+    """
+    Wraps async LLM calls (chain.ainvoke / chain.arun) with a per-attempt timeout, an overall deadline,
+    jittered retries on retryable errors, optional hedging at the observed p90 latency and a circuit breaker.
+    Calls are passed as zero-argument factories so that retries and hedges can start a fresh request.
+    Hedging is off by default: every hedge is a second billed Gemini request.
+    """
+
+    def __init__(self, name: str,
+                 attempt_timeout: float = 30.0,
+                 deadline: float = 60.0,
+                 max_retries: int = 2,
+                 backoff_base: float = 0.5,
+                 backoff_max: float = 4.0,
+                 hedging_enabled: bool = False,
+                 hedge_quantile: float = 0.9,
+                 hedge_min_samples: int = 20,
+                 latency_window: int = 200,
+                 breaker: CircuitBreaker | None = None):
+        self.name = name
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedging_enabled = hedging_enabled
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.latencies = deque(maxlen=latency_window)
+        self.breaker = breaker or CircuitBreaker(name)
+        self.hedges_fired = 0
+
+    @classmethod
+    def from_env(cls, name: str) -> "ResilientLLMCaller":
+        return cls(
+            name,
+            attempt_timeout=float(os.getenv("LLM_ATTEMPT_TIMEOUT_SECONDS", "30")),
+            deadline=float(os.getenv("LLM_DEADLINE_SECONDS", "60")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+            hedging_enabled=os.getenv("LLM_HEDGING_ENABLED", "0") == "1",
+            breaker=CircuitBreaker(
+                name,
+                failure_threshold=int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5")),
+                reset_timeout=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30")),
+            ),
+        )
+
+    def client_kwargs(self) -> dict:
+        # Retry/timeout chỉ ở wrapper này: client Gemini mặc định tự retry 429/503 (backoff mũ) bên trong mỗi attempt,
+        # khiến breaker chỉ thấy timeout 30 s thay vì lỗi retryable và số lần retry nhân lên qua hai tầng.
+        # max_retries của ChatGoogleGenerativeAI là số lần thử tối đa (stop_after_attempt): 1 = không retry.
+        return {"max_retries": 1, "timeout": self.attempt_timeout}
+
+    def hedge_delay(self) -> float | None:
+        if not self.hedging_enabled or len(self.latencies) < self.hedge_min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.hedge_quantile))]
+
+    async def call(self, make_call):
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(f"{self.name}: upstream circuit is open, failing fast.")
+        is_probe = self.breaker.state == CircuitBreaker.HALF_OPEN
+        try:
+            return await self._call_with_retries(make_call)
+        finally:
+            if is_probe:
+                self.breaker.release_probe()
+
+    async def _call_with_retries(self, make_call):
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            remaining = self.deadline - (time.monotonic() - started)
+            attempt_started = time.monotonic()
+            try:
+                # Chỉ hedge ở attempt đầu: đã phải retry nghĩa là upstream đang quá tải, không gửi thêm request trùng.
+                result = await asyncio.wait_for(self._hedged(make_call, hedge=attempt == 0),
+                                                timeout=min(self.attempt_timeout, remaining))
+            except RETRYABLE_ERRORS as e:
+                self.breaker.record_failure()
+                attempt += 1
+                backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+                out_of_time = time.monotonic() - started + backoff >= self.deadline
+                if attempt > self.max_retries or out_of_time or self.breaker.state == CircuitBreaker.OPEN:
+                    logger.error(f"{self.name}: giving up after {attempt} attempt(s): {type(e).__name__}: {e}")
+                    raise
+                logger.warning(f"{self.name}: retryable error on attempt {attempt} ({type(e).__name__}: {e}), retrying in {backoff:.2f}s.")
+                await asyncio.sleep(backoff)
+                continue
+            self.latencies.append(time.monotonic() - attempt_started)
+            self.breaker.record_success()
+            return result
+
+    async def _hedged(self, make_call, hedge: bool = True):
+        delay = self.hedge_delay() if hedge else None
+        primary = asyncio.ensure_future(make_call())
+        if delay is None:
+            return await primary
+
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                self.hedges_fired += 1
+                logger.info(f"{self.name}: no response after {delay:.2f}s (p{int(self.hedge_quantile * 100)}), firing hedged request.")
+                pending.add(asyncio.ensure_future(make_call()))
+            last_error = None
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+                if not pending:
+                    raise last_error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
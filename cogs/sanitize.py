@@ -0,0 +1,21 @@
+# telegram_kali_bot/cogs/sanitize.py
+
+import bleach
+
+# Các thẻ HTML mà Telegram hỗ trợ (parse_mode=HTML)
+ALLOWED_TAGS = ['b', 'strong', 'i', 'em', 'u', 'ins', 's', 'strike', 'del', 
+                'span', 'tg-spoiler', 'a', 'code', 'pre']
+ALLOWED_ATTRIBUTES = {
+    'a': ['href'],
+    'span': ['class'], 
+    # 'tg-spoiler': [] # Not explicitly needed if no attributes
+}
+
+def sanitize_telegram_html(raw_html: str) -> str:
+    # Bleach clean is the primary sanitizer.
+    # LLM is instructed to only use allowed tags and escape content within code/pre.
+    return bleach.clean(raw_html,
+                        tags=ALLOWED_TAGS,
+                        attributes=ALLOWED_ATTRIBUTES,
+                        strip=True, 
+                        strip_comments=True).strip()
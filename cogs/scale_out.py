@@ -0,0 +1,68 @@
+# telegram_kali_bot/cogs/scale_out.py
+
+import asyncio
+import json
+import logging
+import os
+
+from telegram import Update
+from telegram.ext import Application, ContextTypes, TypeHandler
+
+from cogs.queue_backend import QueueBackend, UPDATES_QUEUE_NAME
+
+logger = logging.getLogger(__name__)
+
+# Number of updates a single worker process handles concurrently (LLM calls are I/O bound).
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "8"))
+DEQUEUE_TIMEOUT_SECONDS = 5.0
+
+
+def add_ingress_handler(application: Application, backend: QueueBackend) -> None:
+    """Ingress role: every incoming update is serialized and pushed onto the shared queue, nothing else."""
+
+    async def enqueue_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        await backend.enqueue(UPDATES_QUEUE_NAME, update.to_json())
+
+    application.add_handler(TypeHandler(Update, enqueue_update))
+
+
+async def run_worker(application: Application, backend: QueueBackend, concurrency: int = WORKER_CONCURRENCY) -> None:
+    """Worker role: pull updates from the shared queue and dispatch them through the normal handlers.
+
+    At-most-once: updates are removed from the queue before they are handled, so a crash loses the
+    updates in flight. On cancellation (SIGTERM) in-flight updates are awaited before returning."""
+    semaphore = asyncio.Semaphore(concurrency)
+    in_flight: set[asyncio.Task] = set()
+
+    async def process(payload: str) -> None:
+        try:
+            update = Update.de_json(json.loads(payload), application.bot)
+            await application.process_update(update)
+        except Exception as e:
+            logger.error(f"Worker failed to process update: {e}", exc_info=True)
+        finally:
+            semaphore.release()
+
+    async with application:
+        logger.info(f"Worker started (concurrency={concurrency}). Waiting for updates...")
+        try:
+            while True:
+                await semaphore.acquire()
+                try:
+                    payload = await backend.dequeue(UPDATES_QUEUE_NAME, timeout=DEQUEUE_TIMEOUT_SECONDS)
+                except Exception as e:
+                    semaphore.release()
+                    logger.error(f"Worker failed to dequeue update: {e}", exc_info=True)
+                    await asyncio.sleep(1)
+                    continue
+                if payload is None:
+                    semaphore.release()
+                    continue
+                task = asyncio.create_task(process(payload))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+        finally:
+            if in_flight:
+                logger.info(f"Worker stopping, waiting for {len(in_flight)} in-flight updates...")
+                await asyncio.gather(*in_flight, return_exceptions=True)
+            await backend.close()
@@ -0,0 +1,218 @@
+# telegram_kali_bot/cogs/tool_index.py
+
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+from cogs.memory_profile import LOW_MEMORY_MODE, release_memory
+
+logger = logging.getLogger(__name__)
+
+DATA_FILE = "data/kali_tools_data.json"
+# Số kết quả tối đa lưu tại mỗi node của trie (Telegram chỉ hiển thị tối đa 50 inline results).
+MAX_RESULTS_PER_NODE = 20
+REFRESH_CHECK_INTERVAL = 30.0  # seconds between mtime checks of the data file
+# Low-memory mode: chỉ giữ phần đầu của usage example (inline message vốn đã bị cắt khi hiển thị).
+LOW_MEMORY_USAGE_MAX_CHARS = 800
+
+
+class ToolEntry:
+    __slots__ = ("name", "sub_command", "how_to_install", "usage_example", "url")
+
+    def __init__(self, name: str, sub_command: str, how_to_install: str, usage_example: str, url: str):
+        self.name = name
+        self.sub_command = sub_command
+        self.how_to_install = how_to_install
+        self.usage_example = usage_example
+        self.url = url
+
+
+class _TrieNode:
+    __slots__ = ("children", "entry_ids")
+
+    def __init__(self):
+        self.children: dict[str, "_TrieNode"] = {}
+        self.entry_ids: list[int] = []
+
+
+def _single_deletions(word: str) -> set[str]:
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+class PrefixTrie:
+    """Every node keeps the ids of its first MAX_RESULTS_PER_NODE matches, so a lookup is O(len(prefix))."""
+
+    def __init__(self, max_results_per_node: int = MAX_RESULTS_PER_NODE):
+        self.root = _TrieNode()
+        self.max_results_per_node = max_results_per_node
+
+    def insert(self, key: str, entry_id: int) -> None:
+        node = self.root
+        for char in key:
+            node = node.children.setdefault(char, _TrieNode())
+            if len(node.entry_ids) < self.max_results_per_node and entry_id not in node.entry_ids:
+                node.entry_ids.append(entry_id)
+
+    def search(self, prefix: str) -> list[int]:
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return node.entry_ids
+
+
+class _IndexData:
+    """Everything a lookup reads, swapped in as one reference so a rebuild thread never exposes a half-built index."""
+    __slots__ = ("entries", "trie", "entry_ids_by_key", "keys_by_deletion")
+
+    def __init__(self, entries: list[ToolEntry], trie: PrefixTrie,
+                 entry_ids_by_key: dict[str, list[int]], keys_by_deletion: dict[str, list[str]]):
+        self.entries = entries
+        self.trie = trie
+        self.entry_ids_by_key = entry_ids_by_key
+        # Symmetric-delete index cho fuzzy fallback: key và mọi biến thể bỏ đi 1 ký tự -> các key gốc.
+        # Query khớp nếu nó (hoặc một biến thể bỏ 1 ký tự của nó) nằm trong index: bắt được sai 1 ký tự
+        # (thay/thêm/bớt) và đảo 2 ký tự liền nhau, chỉ với len(query) + 1 lần tra dict.
+        self.keys_by_deletion = keys_by_deletion
+
+
+class ToolLookupIndex:
+    def __init__(self, filepath: str = DATA_FILE):
+        self.filepath = filepath
+        self._data = _IndexData([], PrefixTrie(), {}, {})
+        self._loaded_mtime = None
+        self._last_refresh_check = 0.0
+        self._rebuild_task: asyncio.Task | None = None
+        self._rebuild_requested = False
+
+    @property
+    def entries(self) -> list[ToolEntry]:
+        return self._data.entries
+
+    @property
+    def trie(self) -> PrefixTrie:
+        return self._data.trie
+
+    def memory_components(self) -> dict:
+        data = self._data
+        return {f"index data ({len(data.entries)} entries)": data}
+
+    @staticmethod
+    def _read_entries(filepath: str) -> list[ToolEntry]:
+        # JSON thô chỉ sống trong hàm này, được giải phóng trước khi dựng trie.
+        with open(filepath, 'r', encoding='utf-8') as f:
+            raw_data = json.load(f)
+        entries = []
+        for item in raw_data:
+            name = item.get('name')
+            if not name:
+                continue
+            how_to_install = item.get('how_to_install', '')
+            url = item.get('url', '')
+            commands = item.get('commands') or [{"sub_command": name, "usage_example": ""}]
+            for cmd_item in commands:
+                sub_command = cmd_item.get('sub_command') or name
+                usage_example = cmd_item.get('usage_example', '')
+                if LOW_MEMORY_MODE:
+                    name, sub_command = sys.intern(name), sys.intern(sub_command)
+                    usage_example = usage_example[:LOW_MEMORY_USAGE_MAX_CHARS]
+                entries.append(ToolEntry(name, sub_command, how_to_install, usage_example, url))
+        return entries
+
+    def build(self) -> None:
+        # Đồng bộ (~100-200 ms với vài nghìn entry): chỉ gọi trực tiếp lúc khởi động hoặc từ thread nền.
+        start = time.perf_counter()
+        filepath = self.filepath
+        try:
+            mtime = os.path.getmtime(filepath)
+            entries = self._read_entries(filepath)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            logger.error(f"Cannot build tool lookup index from {filepath}: {e}")
+            return
+
+        # Key ngắn hơn được insert trước => "nmap" đứng trước "nmap-xyz" trong kết quả của prefix "nm".
+        keyed = []
+        for entry_id, entry in enumerate(entries):
+            for key in {entry.name.lower(), entry.sub_command.lower()}:
+                keyed.append((len(key), key, entry_id))
+        keyed.sort()
+
+        trie = PrefixTrie()
+        entry_ids_by_key: dict[str, list[int]] = {}
+        for _, key, entry_id in keyed:
+            trie.insert(key, entry_id)
+            entry_ids_by_key.setdefault(key, []).append(entry_id)
+
+        keys_by_deletion: dict[str, list[str]] = {}
+        for key in entry_ids_by_key:
+            for variant in _single_deletions(key) | {key}:
+                keys_by_deletion.setdefault(variant, []).append(key)
+
+        # Swap toàn bộ bằng một phép gán, handler đang chạy vẫn dùng bản cũ an toàn.
+        self._data = _IndexData(entries, trie, entry_ids_by_key, keys_by_deletion)
+        self._loaded_mtime = mtime
+        if LOW_MEMORY_MODE:
+            # Trả lại cho OS vùng heap của JSON thô và của index cũ (nếu là rebuild).
+            release_memory()
+        logger.info(f"Tool lookup index built: {len(entries)} entries, {len(entry_ids_by_key)} keys in {(time.perf_counter() - start) * 1000:.1f} ms.")
+
+    def refresh_if_changed(self) -> None:
+        now = time.monotonic()
+        if now - self._last_refresh_check < REFRESH_CHECK_INTERVAL:
+            return
+        self._last_refresh_check = now
+        try:
+            mtime = os.path.getmtime(self.filepath)
+        except OSError:
+            return
+        if mtime != self._loaded_mtime:
+            logger.info(f"{self.filepath} changed on disk, rebuilding tool lookup index.")
+            self.rebuild_in_background()
+
+    def rebuild_in_background(self, filepath: str | None = None) -> None:
+        """Rebuilds in a worker thread, then swaps the result in; lookups keep serving the current data meanwhile.
+        Must be called from the running event loop. Requests made during a rebuild are coalesced into one more run."""
+        if filepath is not None:
+            self.filepath = filepath
+        if self._rebuild_task is not None and not self._rebuild_task.done():
+            self._rebuild_requested = True
+            return
+        self._rebuild_task = asyncio.get_running_loop().create_task(self._rebuild())
+
+    async def _rebuild(self) -> None:
+        while True:
+            self._rebuild_requested = False
+            try:
+                await asyncio.to_thread(self.build)
+            except Exception as e:
+                logger.error(f"Tool lookup index rebuild failed: {e}", exc_info=True)
+            if not self._rebuild_requested:
+                return
+
+    def search(self, query: str, limit: int = 10) -> list[ToolEntry]:
+        query = query.strip().lower()
+        if not query:
+            return []
+        data = self._data
+        entry_ids = data.trie.search(query)
+        if not entry_ids:
+            entry_ids = self._fuzzy_search(data, query, limit)
+        return [data.entries[i] for i in entry_ids[:limit]]
+
+    @staticmethod
+    def _fuzzy_search(data: _IndexData, query: str, limit: int) -> list[int]:
+        keys_by_deletion, entry_ids_by_key = data.keys_by_deletion, data.entry_ids_by_key
+        matched_keys = set()
+        for variant in _single_deletions(query) | {query}:
+            matched_keys.update(keys_by_deletion.get(variant, ()))
+        entry_ids = []
+        # Ưu tiên key có độ dài gần với query nhất.
+        for key in sorted(matched_keys, key=lambda k: (abs(len(k) - len(query)), k)):
+            entry_ids.extend(entry_ids_by_key[key])
+            if len(entry_ids) >= limit:
+                break
+        return entry_ids
@@ -2,27 +2,41 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
 from langchain.output_parsers import StructuredOutputParser, ResponseSchema
-import asyncio
+import hashlib
+import os
+
+from cogs.resilience import ResilientLLMCaller, CircuitOpenError
 
 import logging
-# --- Cấu hình Logging ---
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+# Logging được cấu hình một lần duy nhất trong main.py (cogs/logging_setup.py)
 logger = logging.getLogger(__name__)
 
+TRANSLATION_CACHE_TTL_SECONDS = int(os.getenv("TRANSLATION_CACHE_TTL_SECONDS", "86400"))
+TRANSLATION_LLM_MODEL = "gemini-1.5-flash-8b"
+TRANSLATION_LLM_TEMPERATURE = 0.5
+
 class TranslationService:
-    def __init__(self, google_api_key: str):
+    def __init__(self, google_api_key: str, answer_cache=None, llm=None):
         self.llm = None
         self.chain = None
+        # Optional QueueBackend (cogs/queue_backend.py) shared between worker processes.
+        self.answer_cache = answer_cache
+        self.llm_caller = ResilientLLMCaller.from_env("translation")
         
-        if google_api_key:
+        if llm is not None:
+            # Low-memory mode: dùng chung Gemini client với KaliRAGService thay vì tạo client thứ hai.
+            # Thay đổi hành vi: dịch bằng model/temperature của client dùng chung, không phải 1.5-flash-8b / 0.5.
+            self.llm = llm
+            logger.warning(f"Translation uses the shared Gemini client ({getattr(llm, 'model', '?')}, "
+                           f"temperature={getattr(llm, 'temperature', '?')}) instead of {TRANSLATION_LLM_MODEL} "
+                           f"(temperature={TRANSLATION_LLM_TEMPERATURE}).")
+        elif google_api_key:
             try:
                 self.llm = ChatGoogleGenerativeAI(
-                    model="gemini-1.5-flash-8b",
-                    temperature=0.5,
-                    google_api_key=google_api_key
+                    model=TRANSLATION_LLM_MODEL,
+                    temperature=TRANSLATION_LLM_TEMPERATURE,
+                    google_api_key=google_api_key,
+                    **self.llm_caller.client_kwargs()
                 )
                 logger.info("Gemini LLM initialized successfully.")
             except Exception as e:
@@ -64,19 +78,39 @@ class TranslationService:
         else:
             self.chain = None
 
+    def memory_components(self) -> dict:
+        # Cho /memory: LLM client được đo riêng (có thể dùng chung với KaliRAGService).
+        return {"chain + parser": (self.chain, getattr(self, "prompt", None), getattr(self, "output_parser", None))}
+
     async def translate_text(self, text: str) -> str:
         if not self.chain:
             return "Tính năng thông dịch hiện không khả dụng. Vui lòng kiểm tra cấu hình bot."
 
-        loop = asyncio.get_event_loop()
+        cache_key = "translate:" + hashlib.sha256(text.strip().encode('utf-8')).hexdigest()
+        if self.answer_cache is not None:
+            try:
+                cached_output = await self.answer_cache.cache_get(cache_key)
+                if cached_output is not None:
+                    return cached_output
+            except Exception as e:
+                logger.warning(f"Translation cache lookup failed, continuing without cache: {e}")
+
         try:
-            raw_output = await loop.run_in_executor(
-                None,
-                self.chain.run,
-                text
-            )
+            raw_output = await self.llm_caller.call(lambda: self.chain.arun(text))
             parsed_output = self.output_parser.parse(raw_output)
-            return parsed_output.get('output', 'Không thể phân tích kết quả thông dịch.')
+            if 'output' not in parsed_output:
+                return 'Không thể phân tích kết quả thông dịch.'
+            translated_text = parsed_output['output']
+        except CircuitOpenError:
+            logger.warning("Translation upstream circuit is open, failing fast.")
+            return "Dịch vụ thông dịch đang quá tải, vui lòng thử lại sau ít phút."
         except Exception as e:
             logger.error(f"Error during translation chain execution or parsing: {e}")
             return f"Đã xảy ra lỗi khi thông dịch: {e}"
+
+        if self.answer_cache is not None:
+            try:
+                await self.answer_cache.cache_set(cache_key, translated_text, TRANSLATION_CACHE_TTL_SECONDS)
+            except Exception as e:
+                logger.warning(f"Failed to store translation in cache: {e}")
+        return translated_text
@@ -1,26 +1,38 @@
 # telegram_kali_bot/main.py
 
 import os
+import asyncio
+import signal
 import logging
 from dotenv import load_dotenv
+
+# Load .env trước khi import cogs: một số module đọc biến môi trường lúc import.
+load_dotenv()
+
+from cogs.memory_profile import LOW_MEMORY_MODE, start_tracing_if_enabled
+
+# Bật tracemalloc (nếu MEMORY_PROFILING=1) trước khi import langchain/chromadb để thấy cả chi phí import.
+start_tracing_if_enabled()
+
 from telegram import Update
-from telegram.ext import CommandHandler, Application, MessageHandler, filters
+from telegram.ext import CommandHandler, Application, MessageHandler, InlineQueryHandler, TypeHandler, filters
 
-from cogs.translate import TranslationService
-from cogs.kali_rag import KaliRAGService
+from cogs.tool_index import ToolLookupIndex
+from cogs import index_snapshots
+from cogs.queue_backend import InMemoryQueueBackend, create_queue_backend
+from cogs.scale_out import add_ingress_handler, run_worker
+from cogs.logging_setup import setup_logging
 
 import cogs.commands 
 
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+# JSON log qua QueueHandler/QueueListener: ghi log (I/O) chạy ở thread nền, không chặn event loop.
+setup_logging()
 logger = logging.getLogger(__name__)
 
-load_dotenv()
-
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY") # Được sử dụng cho cả RAG (Gemini) và Translation (Gemini)
+# standalone: một process làm tất cả (mặc định). ingress: chỉ long polling + đẩy update vào queue. worker: xử lý update từ queue.
+BOT_ROLE = os.getenv("BOT_ROLE", "standalone")
 
 if not TELEGRAM_BOT_TOKEN:
     logger.critical("TELEGRAM_BOT_TOKEN not found in .env file. Exiting.")
@@ -30,31 +42,104 @@ if not GOOGLE_API_KEY:
     exit(1)
 
 
-def main() -> None:
+def init_services(read_only_index: bool = False, answer_cache=None) -> None:
+    # Import tại đây: process ingress không bao giờ gọi hàm này nên không phải load langchain/chromadb.
+    from cogs.translate import TranslationService
+    from cogs.kali_rag import KaliRAGService
+
     logger.info("Starting service initialization...")
     
-    cogs.commands.translation_service_instance = TranslationService(GOOGLE_API_KEY)
-    if cogs.commands.translation_service_instance.llm is None:
-        logger.warning("TranslationService LLM could not be initialized. Translation feature will be unavailable.")
-    cogs.commands.kali_rag_service_instance = KaliRAGService(GOOGLE_API_KEY)
+    cogs.commands.kali_rag_service_instance = KaliRAGService(GOOGLE_API_KEY, read_only=read_only_index, answer_cache=answer_cache)
     if cogs.commands.kali_rag_service_instance is None or \
     cogs.commands.kali_rag_service_instance.rag_chain_phase1 is None or \
     cogs.commands.kali_rag_service_instance.llm_chain_phase2 is None:
         logger.critical("Failed to initialize one or both RAG chains in KaliRAGService. RAG feature will be critically impaired or unavailable.")
     else:
         logger.info("KaliRAGService and its RAG chains (Phase 1 & 2) initialized successfully.")
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+
+    # Low-memory mode: Translation dùng chung Gemini client của RAG (model gemini-1.5-flash-latest, temperature 0.2).
+    shared_llm = cogs.commands.kali_rag_service_instance.llm if LOW_MEMORY_MODE else None
+    cogs.commands.translation_service_instance = TranslationService(GOOGLE_API_KEY, answer_cache=answer_cache, llm=shared_llm)
+    if cogs.commands.translation_service_instance.llm is None:
+        logger.warning("TranslationService LLM could not be initialized. Translation feature will be unavailable.")
+
+    # Index tra cứu tool cho inline mode, build 1 lần lúc khởi động (tự rebuild khi file data thay đổi).
+    index_version = cogs.commands.kali_rag_service_instance.index_version
+    cogs.commands.tool_index_instance = ToolLookupIndex(index_snapshots.snapshot_data_file(index_version)) if index_version else ToolLookupIndex()
+    cogs.commands.tool_index_instance.build()
+    cogs.commands.kali_rag_service_instance.swap_listeners.append(_rebuild_tool_index_for_version)
+
+
+def _rebuild_tool_index_for_version(version: str) -> None:
+    # Snapshot mới có file data riêng => inline mode dùng đúng dữ liệu của index đang phục vụ.
+    # Gọi từ swap_to_version (trên event loop): build ở thread nền rồi mới swap vào.
+    cogs.commands.tool_index_instance.rebuild_in_background(index_snapshots.snapshot_data_file(version))
+
+
+async def _start_index_watcher(application: Application) -> None:
+    cogs.commands.kali_rag_service_instance.start_index_watcher()
+
+
+async def _run_worker(application: Application, backend) -> None:
+    cogs.commands.kali_rag_service_instance.start_index_watcher()
+    # docker stop gửi SIGTERM: huỷ vòng dequeue để run_worker xử lý nốt các update đang chạy rồi mới thoát.
+    worker_task = asyncio.current_task()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, worker_task.cancel)
+    try:
+        await run_worker(application, backend)
+    except asyncio.CancelledError:
+        logger.info("Worker stopped (SIGTERM).")
+
+
+def register_handlers(application: Application) -> None:
+    application.add_handler(TypeHandler(Update, cogs.commands.assign_request_id), group=-1)
     application.add_handler(CommandHandler("start", cogs.commands.start_command))
     application.add_handler(CommandHandler("hello", cogs.commands.hello_command))
     application.add_handler(CommandHandler("ping", cogs.commands.ping_command))
     application.add_handler(CommandHandler("translate", cogs.commands.translate_command))
     application.add_handler(CommandHandler("help", cogs.commands.help_command))
     application.add_handler(CommandHandler("ask_kali", cogs.commands.ask_kali_command))
+    application.add_handler(CommandHandler("index_admin", cogs.commands.index_admin_command))
+    application.add_handler(CommandHandler("memory", cogs.commands.memory_command))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, cogs.commands.echo_message))
+    application.add_handler(InlineQueryHandler(cogs.commands.inline_query_handler))
+
+
+def _create_shared_queue_backend():
+    # memory:// chỉ sống trong một process: ingress ghi vào đó thì không worker nào đọc được, update mất âm thầm.
+    backend = create_queue_backend()
+    if isinstance(backend, InMemoryQueueBackend):
+        logger.critical(f"BOT_ROLE={BOT_ROLE} needs a queue shared between processes (QUEUE_BACKEND_URL=sqlite:///... or redis://...), "
+                        f"got memory://. Exiting.")
+        exit(1)
+    return backend
+
+
+def main() -> None:
+    if BOT_ROLE == "ingress":
+        # Ingress không cần RAG/LLM: chỉ nhận update và đẩy vào queue dùng chung.
+        application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+        add_ingress_handler(application, _create_shared_queue_backend())
+        logger.info("Ingress đang bắt đầu Long Polling...")
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
+        logger.info("Ingress đã dừng Long Polling.")
+        return
+
+    if BOT_ROLE == "worker":
+        backend = _create_shared_queue_backend()
+        init_services(read_only_index=True, answer_cache=backend)
+        application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+        register_handlers(application)
+        asyncio.run(_run_worker(application, backend))
+        return
+
+    init_services()
+    application = Application.builder().token(TELEGRAM_BOT_TOKEN).post_init(_start_index_watcher).build()
+    register_handlers(application)
 
     logger.info("Bot đang bắt đầu Long Polling...")
     application.run_polling(allowed_updates=Update.ALL_TYPES)
     logger.info("Bot đã dừng Long Polling.")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
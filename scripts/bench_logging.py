@@ -0,0 +1,122 @@
+"""
+Caller-side cost of logging one /ask_kali request: the old synchronous setup (basicConfig
+StreamHandler, full LLM HTML at INFO twice per request) vs cogs/logging_setup.py (JSON records
+handed to a QueueListener thread, payloads sampled at LOG_PAYLOAD_SAMPLE_RATE).
+
+Each mode runs in its own child process, writing to a temp file (or --sink) so the numbers
+include real I/O. Reported times are what the event loop would spend inside logging calls.
+
+    python3 scripts/bench_logging.py --requests 20000 --payload-chars 4000
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODES = ("sync_full", "queue_sampled")
+
+
+def _percentile(values, quantile):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * quantile))]
+
+
+def _fake_html(chars, rng):
+    words = ["<b>nmap</b>", "-sU", "<code>&lt;target&gt;</code>", "quét", "cổng", "UDP", "\n", "<i>ví dụ</i>"]
+    parts, size = [], 0
+    while size < chars:
+        word = rng.choice(words)
+        parts.append(word)
+        size += len(word) + 1
+    return " ".join(parts)
+
+
+def _run_child(mode, requests, payload_chars, sink):
+    import logging
+    rng = random.Random(1)
+    payloads = [_fake_html(payload_chars, rng) for _ in range(64)]
+    query = "how to scan udp ports with nmap"
+    stream = open(sink, 'a', encoding='utf-8')
+
+    if mode == "sync_full":
+        logging.basicConfig(
+            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            level=logging.INFO,
+            stream=stream,
+        )
+        logger = logging.getLogger("cogs.commands")
+
+        def handle_request(i):
+            html = payloads[i % len(payloads)]
+            logger.info(f"Phase 1 RAG: Querying for '{query}'")
+            logger.info(f"Phase 1 RAG: Response: '{html.replace(chr(10), ' ')[:200]}...'")
+            logger.info(f"LLM Raw HTML (before bleaching) for query '{query}':\n---\n{html}\n---")
+            logger.info(f"LLM HTML Response (after bleaching) for query '{query}':\n---\n{html}\n---")
+    else:
+        from cogs.logging_setup import RequestTimer, log_payload, new_request_id, setup_logging, stop_logging
+        setup_logging(stream=stream)
+        logger = logging.getLogger("cogs.commands")
+
+        def handle_request(i):
+            html = payloads[i % len(payloads)]
+            new_request_id(f"u{i}")
+            timer = RequestTimer("ask_kali")
+            logger.info(f"Phase 1 RAG: Querying for '{query}'")
+            log_payload(logger, "Phase 1 RAG: Response", html)
+            log_payload(logger, "LLM raw HTML (before bleaching)", html, query=query)
+            log_payload(logger, "LLM HTML (after bleaching)", html, query=query)
+            timer.finish("ok")
+
+    for i in range(200):  # warm-up
+        handle_request(i)
+
+    samples = []
+    started = time.perf_counter()
+    for i in range(requests):
+        t0 = time.perf_counter()
+        handle_request(i)
+        samples.append(time.perf_counter() - t0)
+    caller_total = time.perf_counter() - started
+
+    drain_started = time.perf_counter()
+    if mode == "queue_sampled":
+        stop_logging()
+    stream.flush()
+    drain = time.perf_counter() - drain_started
+    stream.close()
+
+    print(f"{mode:>14} {_percentile(samples, 0.5) * 1e6:>8.1f} {_percentile(samples, 0.99) * 1e6:>8.1f} "
+          f"{caller_total * 1000:>10.0f} {drain * 1000:>9.0f} {os.path.getsize(sink) / 1024 / 1024:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--payload-chars", type=int, default=4000)
+    parser.add_argument("--sample-rate", type=float, default=0.01, help="LOG_PAYLOAD_SAMPLE_RATE for queue mode")
+    parser.add_argument("--sink", help="log file (default: a temp file per mode)")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _run_child(args.child, args.requests, args.payload_chars, args.sink)
+        return
+
+    print(f"{args.requests} requests, {args.payload_chars}-char LLM HTML, sample rate {args.sample_rate}")
+    print(f"{'mode':>14} {'p50 µs':>8} {'p99 µs':>8} {'caller ms':>10} {'drain ms':>9} {'log MiB':>9}")
+    env = dict(os.environ, LOG_FORMAT="json", LOG_LEVEL="INFO", LOG_PAYLOAD_SAMPLE_RATE=str(args.sample_rate))
+    for mode in MODES:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            sink = args.sink or os.path.join(tmp_dir, f"{mode}.log")
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--child", mode,
+                            "--requests", str(args.requests), "--payload-chars", str(args.payload_chars),
+                            "--sink", sink], env=env, check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Peak and steady-state RSS of the bot's in-memory data, normal vs LOW_MEMORY_MODE=1.
+The "services" scenario constructs KaliRAGService and TranslationService with a stub key
+(no index, no API calls) to measure the shared Gemini client.
+
+Every scenario runs in a fresh interpreter so the numbers do not leak into each other.
+Scenarios whose dependencies are not installed are reported as skipped.
+
+    python3 scripts/bench_memory.py --tools 650
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCENARIOS = ["baseline", "tool_index+canonical", "ingress_imports", "rag_imports", "services"]
+STUB_GOOGLE_API_KEY = "bench-memory-stub-key"  # clients are constructed but never called
+
+
+def _run_child(scenario, data_dir):
+    # Import tại đây: LOW_MEMORY_MODE được đọc lúc import cogs.memory_profile.
+    from cogs.memory_profile import current_rss_bytes, peak_rss_bytes, release_memory, LOW_MEMORY_MODE
+
+    keep_alive = []
+    if scenario == "tool_index+canonical":
+        from cogs.canonical_answers import CanonicalAnswerStore
+        from cogs.tool_index import ToolLookupIndex
+        index = ToolLookupIndex(os.path.join(data_dir, "kali_tools_data.json"))
+        index.build()
+        keep_alive += [index, CanonicalAnswerStore.load(os.path.join(data_dir, "canonical_answers.json"))]
+    elif scenario == "ingress_imports":
+        import cogs.commands, cogs.scale_out  # noqa: F401  (what BOT_ROLE=ingress loads)
+    elif scenario == "rag_imports":
+        import cogs.kali_rag, cogs.translate  # noqa: F401
+    elif scenario == "services":
+        # KaliRAGService + TranslationService như init_services() trong main.py: normal = 2 Gemini client,
+        # low-memory = TranslationService dùng chung client của RAG. Chạy trong thư mục rỗng nên không có
+        # data/chroma_db => không build index, không gọi API.
+        from cogs.kali_rag import KaliRAGService
+        from cogs.translate import TranslationService
+        empty_cwd = os.path.join(data_dir, "empty_cwd")
+        os.makedirs(empty_cwd, exist_ok=True)
+        os.chdir(empty_cwd)
+        rag = KaliRAGService(STUB_GOOGLE_API_KEY, read_only=True)
+        rag.get_llm()  # client mà _build_state tạo khi có index
+        translation = TranslationService(STUB_GOOGLE_API_KEY, llm=rag.llm if LOW_MEMORY_MODE else None)
+        keep_alive += [rag, translation]
+
+    if LOW_MEMORY_MODE:
+        release_memory()
+    else:
+        import gc
+        gc.collect()
+    print(json.dumps({"peak": peak_rss_bytes(), "steady": current_rss_bytes()}))
+
+
+def _write_fixtures(data_dir, num_tools):
+    from bench_tool_lookup import _synthetic_corpus
+    tools = _synthetic_corpus(num_tools, usage_lines=60)
+    with open(os.path.join(data_dir, "kali_tools_data.json"), 'w', encoding='utf-8') as f:
+        json.dump(tools, f)
+    answers = {tool["name"]: {"source_hash": "x" * 64, "answer_html": f"<b>{tool['name']}</b> " + "lorem ipsum " * 250,
+                              "generated_at": "2026-01-01T00:00:00"} for tool in tools}
+    with open(os.path.join(data_dir, "canonical_answers.json"), 'w', encoding='utf-8') as f:
+        json.dump({"version": 1, "tools": answers}, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tools", type=int, default=650)
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--data-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _run_child(args.child, args.data_dir)
+        return
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        _write_fixtures(data_dir, args.tools)
+        print(f"{'scenario':>22} {'mode':>6} {'peak MiB':>9} {'steady MiB':>11}")
+        for scenario in SCENARIOS:
+            for low_memory in ("0", "1"):
+                env = dict(os.environ, LOW_MEMORY_MODE=low_memory)
+                result = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", scenario, "--data-dir", data_dir],
+                                        env=env, capture_output=True, text=True)
+                mode = "low" if low_memory == "1" else "normal"
+                if result.returncode != 0:
+                    reason = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed"
+                    print(f"{scenario:>22} {mode:>6}  skipped: {reason}")
+                    continue
+                rss = json.loads(result.stdout.strip().splitlines()[-1])
+                print(f"{scenario:>22} {mode:>6} {rss['peak'] / 2**20:>9.1f} {rss['steady'] / 2**20:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Throughput benchmark for the ingress/worker split.
+
+Spawns N worker processes, each running cogs.scale_out.run_worker against a shared
+SQLite queue (the same backend the production deployment swaps for Redis). The
+Application is a stub whose process_update does the per-update CPU work of a real
+/ask_kali reply (JSON round trip of the update, bleach sanitizing of an LLM-sized
+HTML answer) around a simulated LLM latency.
+
+Every run uses the same total concurrency (--total-concurrency, split evenly across
+the workers), so adding processes can only help once one process is CPU-bound:
+throughput grows with N up to the number of CPU cores, and stays flat on a single core.
+
+    python3 scripts/bench_scale_out.py --jobs 400 --workers 1 2 4 --latency 0.2
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import Update
+
+from cogs.queue_backend import SQLiteQueueBackend, UPDATES_QUEUE_NAME
+from cogs.sanitize import sanitize_telegram_html
+from cogs.scale_out import run_worker
+
+DONE_QUEUE_NAME = "bench_done"
+# ~4.7 KB, cỡ một câu trả lời /ask_kali; có thẻ bị bleach loại bỏ (p, ul, li, script).
+SAMPLE_LLM_HTML = (
+    "<b>nmap</b> - Network exploration tool.\n<p>Quét cổng:</p><pre><code>nmap -sS -p- 10.0.0.1 &lt;target&gt;</code></pre>\n"
+    "<ul><li><i>-sV</i>: phát hiện phiên bản</li></ul><a href=\"https://www.kali.org/tools/nmap/\">Docs</a><script>x</script>\n"
+) * 20
+
+
+class _BenchApplication:
+    """Stands in for telegram.ext.Application inside run_worker: process_update mimics an /ask_kali handler."""
+
+    def __init__(self, backend, latency):
+        self.bot = None
+        self.backend = backend
+        self.latency = latency
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def process_update(self, update):
+        json.loads(update.to_json())  # context/handler dispatch reads the update
+        await asyncio.sleep(self.latency)  # simulated ask_question / translate_text
+        sanitize_telegram_html(SAMPLE_LLM_HTML)  # CPU-bound, chạy trên event loop như trong ask_kali_command
+        await self.backend.enqueue(DONE_QUEUE_NAME, str(update.update_id))
+
+
+async def _worker_main(db_path, concurrency, latency, ready_queue, stop_event):
+    # Chạy đúng run_worker của production (dequeue, semaphore, de_json, process_update).
+    backend = SQLiteQueueBackend(db_path)
+    application = _BenchApplication(SQLiteQueueBackend(db_path), latency)
+    worker = asyncio.create_task(run_worker(application, backend, concurrency))
+    ready_queue.put(os.getpid())
+    while not stop_event.is_set():
+        await asyncio.sleep(0.05)
+    worker.cancel()
+    await asyncio.gather(worker, return_exceptions=True)
+    await application.backend.close()
+
+
+def _worker_process(db_path, concurrency, latency, ready_queue, stop_event):
+    asyncio.run(_worker_main(db_path, concurrency, latency, ready_queue, stop_event))
+
+
+async def _run_once(num_workers, num_jobs, concurrency, latency):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "queue.db")
+        backend = SQLiteQueueBackend(db_path)
+        # spawn: fork sau khi thread pool của event loop cha đã chạy có thể deadlock.
+        mp_context = multiprocessing.get_context("spawn")
+        ready_queue = mp_context.Queue()
+        stop_event = mp_context.Event()
+        processes = [
+            mp_context.Process(target=_worker_process, args=(db_path, concurrency, latency, ready_queue, stop_event))
+            for _ in range(num_workers)
+        ]
+        for p in processes:
+            p.start()
+        for _ in processes:  # không tính thời gian khởi động process vào throughput
+            await asyncio.to_thread(ready_queue.get)
+
+        start = time.perf_counter()
+        for i in range(num_jobs):
+            await backend.enqueue(UPDATES_QUEUE_NAME, Update(update_id=i).to_json())
+
+        completed = 0
+        while completed < num_jobs:
+            if await backend.dequeue(DONE_QUEUE_NAME, timeout=5.0) is not None:
+                completed += 1
+        elapsed = time.perf_counter() - start
+
+        stop_event.set()
+        for p in processes:
+            p.join()
+        await backend.close()
+        return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=400)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--total-concurrency", type=int, default=64,
+                        help="in-flight jobs across all workers (each worker gets WORKER_CONCURRENCY = total / workers)")
+    parser.add_argument("--latency", type=float, default=0.2, help="simulated LLM latency in seconds")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    for _ in range(20):
+        sanitize_telegram_html(SAMPLE_LLM_HTML)
+    cpu_ms = (time.perf_counter() - start) / 20 * 1000
+    print(f"CPU cost per update ~{cpu_ms:.1f} ms (sanitize) | {os.cpu_count()} CPU core(s) | "
+          f"total concurrency {args.total_concurrency} | latency {args.latency}s")
+
+    baseline = None
+    print(f"{'workers':>8} {'conc/w':>7} {'seconds':>9} {'jobs/s':>9} {'speedup':>8}")
+    for num_workers in args.workers:
+        concurrency = max(1, args.total_concurrency // num_workers)
+        elapsed = asyncio.run(_run_once(num_workers, args.jobs, concurrency, args.latency))
+        throughput = args.jobs / elapsed
+        baseline = baseline or throughput
+        print(f"{num_workers:>8} {concurrency:>7} {elapsed:>9.2f} {throughput:>9.1f} {throughput / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
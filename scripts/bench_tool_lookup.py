@@ -0,0 +1,94 @@
+"""
+Microbenchmark of the inline-mode tool lookup (prefix trie + fuzzy fallback).
+
+Uses data/kali_tools_data.json when present, otherwise a synthetic corpus of
+similar size (~650 tools, several sub-commands each).
+
+    python3 scripts/bench_tool_lookup.py --lookups 20000
+"""
+import argparse
+import json
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cogs.tool_index import DATA_FILE, ToolLookupIndex
+
+
+def _synthetic_corpus(num_tools, seed=1, usage_lines=20):
+    rng = random.Random(seed)
+    tools = []
+    for i in range(num_tools):
+        name = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10))) + str(i)
+        commands = [{"sub_command": f"{name}-{suffix}", "usage_example": f"{name}-{suffix} -h\n" * usage_lines}
+                    for suffix in rng.sample(["scan", "crack", "dump", "enum", "proxy", "client", "server"], 4)]
+        tools.append({"name": name, "url": f"https://www.kali.org/tools/{name}/",
+                      "how_to_install": f"sudo apt install {name}", "commands": commands})
+    return tools
+
+
+def _typo(key, rng):
+    if len(key) < 3:
+        return key + "x"
+    i = rng.randint(1, len(key) - 2)
+    kind = rng.choice(["substitute", "delete", "swap"])
+    if kind == "substitute":
+        return key[:i] + "x" + key[i + 1:]
+    if kind == "delete":
+        return key[:i] + key[i + 1:]
+    return key[:i] + key[i + 1] + key[i] + key[i + 2:]
+
+
+def _percentile(values, quantile):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * quantile))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--synthetic-tools", type=int, default=650)
+    args = parser.parse_args()
+
+    data_file = DATA_FILE
+    tmp_dir = None
+    if not os.path.exists(data_file):
+        tmp_dir = tempfile.TemporaryDirectory()
+        data_file = os.path.join(tmp_dir.name, "kali_tools_data.json")
+        with open(data_file, 'w', encoding='utf-8') as f:
+            json.dump(_synthetic_corpus(args.synthetic_tools), f)
+        print(f"{DATA_FILE} not found, using a synthetic corpus of {args.synthetic_tools} tools.")
+
+    index = ToolLookupIndex(data_file)
+    start = time.perf_counter()
+    index.build()
+    print(f"build: {(time.perf_counter() - start) * 1000:.1f} ms for {len(index.entries)} entries")
+
+    rng = random.Random(2)
+    keys = list(index._data.entry_ids_by_key)
+    workloads = {
+        "prefix": [key[:rng.randint(1, len(key))] for key in rng.choices(keys, k=args.lookups)],
+        "exact": rng.choices(keys, k=args.lookups),
+        # one typo (substitution, deletion or adjacent swap) => usually a trie miss, fuzzy fallback
+        "typo": [_typo(key, rng) for key in rng.choices(keys, k=args.lookups)],
+    }
+    print(f"{'workload':>9} {'p50 us':>8} {'p99 us':>8} {'max us':>8}")
+    for workload, queries in workloads.items():
+        latencies = []
+        for query in queries:
+            t0 = time.perf_counter()
+            index.search(query)
+            latencies.append((time.perf_counter() - t0) * 1e6)
+        print(f"{workload:>9} {_percentile(latencies, 0.5):>8.1f} {_percentile(latencies, 0.99):>8.1f} {max(latencies):>8.1f}")
+
+    if tmp_dir is not None:
+        tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
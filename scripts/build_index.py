@@ -0,0 +1,136 @@
+import argparse
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+from dotenv import load_dotenv
+
+# Cho phép chạy trực tiếp `python3 scripts/build_index.py` từ thư mục gốc của project
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cogs import index_snapshots
+from cogs.canonical_answers import CANONICAL_ANSWERS_FILE
+from cogs.kali_rag import KaliRAGService, CHROMA_DB_DIR, COLLECTION_NAME, DATA_FILE
+
+
+def build_legacy_index(google_api_key):
+    print(f"[{time.strftime('%H:%M:%S')}] Building shared Chroma index at {CHROMA_DB_DIR}...")
+    service = KaliRAGService(google_api_key)
+    if service.retriever is None:
+        print(f"[{time.strftime('%H:%M:%S')}] Index build failed. See logs above.")
+        sys.exit(1)
+    print(f"[{time.strftime('%H:%M:%S')}] Index ready. Workers can now open it in read-only mode.")
+
+
+def _file_sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def current_snapshot_is_up_to_date():
+    current_version = index_snapshots.read_current_version()
+    if not current_version or not os.path.exists(DATA_FILE):
+        return False
+    return index_snapshots.read_manifest(current_version).get("data_sha256") == _file_sha256(DATA_FILE)
+
+
+def build_snapshot(google_api_key):
+    """Builds a complete, immutable snapshot next to the live ones. Nothing running is touched."""
+    from langchain_chroma import Chroma
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+    version = index_snapshots.new_version_name()
+    os.makedirs(index_snapshots.snapshot_path(version), exist_ok=False)
+    print(f"[{time.strftime('%H:%M:%S')}] Building index snapshot '{version}'...")
+
+    shutil.copyfile(DATA_FILE, index_snapshots.snapshot_data_file(version))
+    documents = KaliRAGService._load_and_prepare_data(index_snapshots.snapshot_data_file(version))
+    if not documents:
+        print(f"[{time.strftime('%H:%M:%S')}] No documents to index. Aborting.")
+        sys.exit(1)
+    embeddings = GoogleGenerativeAIEmbeddings(google_api_key=google_api_key, model="models/embedding-001")
+    Chroma.from_documents(
+        documents=documents,
+        embedding=embeddings,
+        persist_directory=index_snapshots.snapshot_chroma_dir(version),
+        collection_name=COLLECTION_NAME
+    )
+
+    # Mang theo câu trả lời precompute của version trước; precompute_answers.py chỉ sinh lại tool đã thay đổi.
+    current_version = index_snapshots.read_current_version()
+    previous_answers = index_snapshots.snapshot_canonical_answers_file(current_version) if current_version else CANONICAL_ANSWERS_FILE
+    if os.path.exists(previous_answers):
+        shutil.copyfile(previous_answers, index_snapshots.snapshot_canonical_answers_file(version))
+
+    index_snapshots.write_manifest(version, {
+        "version": version,
+        "created_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "documents": len(documents),
+        "collection": COLLECTION_NAME,
+        "data_sha256": _file_sha256(index_snapshots.snapshot_data_file(version)),
+    })
+    print(f"[{time.strftime('%H:%M:%S')}] Snapshot '{version}' built with {len(documents)} documents.")
+    return version
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the Chroma index used by the bot.")
+    parser.add_argument("--snapshot", action="store_true", help="build a new versioned snapshot under chroma_db/snapshots/")
+    parser.add_argument("--precompute", action="store_true", help="with --snapshot: refresh canonical answers before publishing")
+    parser.add_argument("--if-changed", action="store_true", help="with --snapshot: skip if the live snapshot was built from the same data file")
+    parser.add_argument("--no-publish", action="store_true", help="with --snapshot: build only, do not update chroma_db/CURRENT")
+    parser.add_argument("--publish", metavar="VERSION", help="make an existing snapshot the live one (clears any pin)")
+    parser.add_argument("--unpin", action="store_true", help="allow --if-changed builds to publish again after a rollback/swap")
+    parser.add_argument("--list", action="store_true", help="list snapshots")
+    args = parser.parse_args()
+
+    if args.list:
+        current_version = index_snapshots.read_current_version()
+        pinned_version = index_snapshots.read_pinned_version()
+        for version in index_snapshots.list_versions():
+            print(f"{'*' if version == current_version else ' '} {version}{' (pinned)' if version == pinned_version else ''}")
+        sys.exit(0)
+
+    if args.unpin:
+        index_snapshots.unpin()
+        print(f"[{time.strftime('%H:%M:%S')}] Unpinned. The next --if-changed build publishes normally.")
+        sys.exit(0)
+
+    if args.publish:
+        index_snapshots.publish_version(args.publish)
+        print(f"[{time.strftime('%H:%M:%S')}] Published '{args.publish}'. Running services pick it up on their next check.")
+        sys.exit(0)
+
+    load_dotenv()
+    google_api_key = os.getenv("GOOGLE_API_KEY")
+    if not google_api_key:
+        print("GOOGLE_API_KEY not found in environment. Cannot build embeddings.")
+        sys.exit(1)
+
+    if not args.snapshot:
+        build_legacy_index(google_api_key)
+        sys.exit(0)
+
+    pinned_version = index_snapshots.read_pinned_version()
+    if args.if_changed and pinned_version:
+        # Admin đã rollback/swap thủ công: không build + publish đè lên lựa chọn đó.
+        print(f"[{time.strftime('%H:%M:%S')}] Live index is pinned to '{pinned_version}' (rollback/swap). "
+              f"Skipping. Run with --unpin (or /index_admin unpin) to resume automatic publishing.")
+        sys.exit(0)
+
+    if args.if_changed and current_snapshot_is_up_to_date():
+        print(f"[{time.strftime('%H:%M:%S')}] Live snapshot '{index_snapshots.read_current_version()}' already matches {DATA_FILE}. Nothing to do.")
+        sys.exit(0)
+
+    version = build_snapshot(google_api_key)
+    if args.precompute:
+        precompute_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "precompute_answers.py")
+        subprocess.run([sys.executable, precompute_script, "--snapshot", version], check=True)
+    if args.no_publish:
+        print(f"[{time.strftime('%H:%M:%S')}] Not published. Publish later with: python3 scripts/build_index.py --publish {version}")
+    else:
+        index_snapshots.publish_version(version)
+        print(f"[{time.strftime('%H:%M:%S')}] Published '{version}'. Running services pick it up on their next check.")
@@ -0,0 +1,311 @@
+"""
+End-to-end load test: the real python-telegram-bot Application and handlers from main.py,
+talking over HTTP to a local fake Telegram Bot API server.
+
+The real KaliRAGService and TranslationService are used, with FakeLLM injected as their
+chains. Everything except the Gemini calls is exercised: canonical answers, the answer
+cache (--answer-cache), the request log, the phase 1 -> phase 2 fallback, resilience
+and the translation output parser.
+
+N simulated chats each send a command (/ask_kali, /ask_kali on a precomputed tool,
+/translate or /ping), wait for all of the bot's replies, then immediately send the next
+one. Reports sustained updates/second and reply latency percentiles (update queued ->
+last reply received) per command.
+
+    python3 scripts/loadtest_bot.py --chats 50 --duration 30 --llm-latency 0.5
+    python3 scripts/loadtest_bot.py --chats 50 --concurrent-updates 64 --answer-cache
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FAKE_TOKEN = "123456:LOADTEST"
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "LoadTestBot", "username": "loadtest_bot"}
+
+# command -> (message text, number of bot replies that complete the interaction)
+# {n}: 1..--distinct-queries, so the answer caches see a realistic mix of hits and misses.
+COMMANDS = {
+    "/ask_kali": ("/ask_kali how to scan udp ports with nmap variant {n}", 2),  # "Đang tìm kiếm..." + answer
+    "/ask_kali_tool": ("/ask_kali cách dùng nmap", 2),  # precomputed canonical answer
+    "/translate": ("/translate xin chào thế giới lần {n}", 2),  # "Đang thông dịch..." + result
+    "/ping": ("/ping", 1),
+}
+NO_CONTEXT_MARKER = "[NO_CONTEXT_DATA_FOUND]"
+
+
+def _percentile(values, quantile):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * quantile))]
+
+
+class FakeBotAPIState:
+    def __init__(self, num_chats, command_mix, distinct_queries, seed=1):
+        self.condition = threading.Condition()
+        self.updates = []
+        self.next_update_id = 1
+        self.next_message_id = 1
+        self.running = False
+        self.command_mix = command_mix
+        self.distinct_queries = distinct_queries
+        self.random = random.Random(seed)
+        self.chat_ids = [100000 + i for i in range(num_chats)]
+        self.in_flight = {}  # chat_id -> (command, queued_at, replies_seen)
+        self.latencies = defaultdict(list)
+        self.api_calls = Counter()
+
+    def _message(self, chat_id, text, from_user):
+        message_id = self.next_message_id
+        self.next_message_id += 1
+        return {"message_id": message_id, "date": int(time.time()), "chat": {"id": chat_id, "type": "private"},
+                "from": from_user, "text": text}
+
+    def _queue_command(self, chat_id):
+        # caller holds self.condition
+        command = self.random.choice(self.command_mix)
+        text = COMMANDS[command][0].format(n=self.random.randint(1, self.distinct_queries))
+        message = self._message(chat_id, text, {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"})
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        self.updates.append({"update_id": self.next_update_id, "message": message})
+        self.next_update_id += 1
+        self.in_flight[chat_id] = (command, time.perf_counter(), 0)
+        self.condition.notify_all()
+
+    def start_load(self):
+        with self.condition:
+            self.running = True
+            for chat_id in self.chat_ids:
+                self._queue_command(chat_id)
+
+    def stop_load(self):
+        with self.condition:
+            self.running = False
+
+    def get_updates(self, offset, timeout):
+        deadline = time.monotonic() + min(timeout, 5.0)
+        with self.condition:
+            while True:
+                pending = [u for u in self.updates if u["update_id"] >= offset]
+                # Bot confirmed everything below offset: drop it.
+                self.updates = pending
+                if pending or time.monotonic() >= deadline:
+                    return pending
+                self.condition.wait(deadline - time.monotonic())
+
+    def record_reply(self, chat_id, text):
+        with self.condition:
+            message = self._message(chat_id, text, BOT_USER)
+            if chat_id in self.in_flight:
+                command, queued_at, replies_seen = self.in_flight[chat_id]
+                replies_seen += 1
+                if replies_seen >= COMMANDS[command][1]:
+                    del self.in_flight[chat_id]
+                    if self.running:
+                        self.latencies[command].append(time.perf_counter() - queued_at)
+                        self._queue_command(chat_id)
+                else:
+                    self.in_flight[chat_id] = (command, queued_at, replies_seen)
+            return message
+
+
+def _make_handler(state):
+    class FakeBotAPIHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _params(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length).decode("utf-8") if length else ""
+            if not body:
+                return {}
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                return json.loads(body)
+            # python-telegram-bot posts form fields whose values are JSON-encoded
+            params = {}
+            for key, values in parse_qs(body).items():
+                try:
+                    params[key] = json.loads(values[0])
+                except json.JSONDecodeError:
+                    params[key] = values[0]
+            return params
+
+        def _reply(self, result):
+            payload = json.dumps({"ok": True, "result": result}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            try:
+                self.wfile.write(payload)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the bot gave up on a long poll during shutdown
+
+        def do_POST(self):
+            method = self.path.rstrip("/").rsplit("/", 1)[-1]
+            params = self._params()
+            state.api_calls[method] += 1
+            if method == "getMe":
+                self._reply(BOT_USER)
+            elif method == "getUpdates":
+                self._reply(state.get_updates(int(params.get("offset") or 0), float(params.get("timeout") or 0)))
+            elif method in ("sendMessage", "editMessageText"):
+                self._reply(state.record_reply(int(params["chat_id"]), params.get("text", "")))
+            else:  # deleteWebhook, setMyCommands, answerInlineQuery, ...
+                self._reply(True)
+
+        do_GET = do_POST
+
+    return FakeBotAPIHandler
+
+
+def _build_services(args, answer_cache):
+    """Real services with FakeLLM in place of the Gemini chains (no API key: nothing is indexed or called)."""
+    import logging
+    from langchain_core.runnables import RunnableLambda
+    from cogs.canonical_answers import CanonicalAnswerStore
+    from cogs.fake_llm import FakeLLM
+    from cogs.kali_rag import KaliRAGService, _IndexState
+    from cogs.translate import TranslationService
+
+    rng = random.Random(2)
+
+    def rag_response(input):
+        if isinstance(input, dict):  # phase 2: {"question": ...}
+            return f"<b>nmap</b> (general knowledge) <code>&lt;target&gt;</code> for {input['question']}"
+        if rng.random() < args.no_context_rate:
+            return NO_CONTEXT_MARKER
+        return "<b>nmap</b> -sU <code>&lt;target&gt;</code>"
+
+    def translation_response(prompt):
+        # Định dạng mà StructuredOutputParser của TranslationService mong đợi.
+        text = prompt.to_string().rsplit(":", 1)[-1].strip()
+        return "```json\n" + json.dumps({"input": text, "output": f"Hello world ({text})"}, ensure_ascii=False) + "\n```"
+
+    def sync_call_not_supported(input):
+        raise RuntimeError("the bot only calls the LLM asynchronously")
+
+    rag_llm = FakeLLM(response=rag_response, latency=args.llm_latency, jitter=args.llm_jitter, seed=3)
+    translation_llm = FakeLLM(response=translation_response, latency=args.llm_latency, jitter=args.llm_jitter, seed=4)
+
+    canonical_answers = CanonicalAnswerStore()  # chỉ trong RAM, không save
+    canonical_answers.put("nmap", "x" * 64, "<b>nmap</b>: precomputed canonical answer")
+    logging.disable(logging.WARNING)  # cảnh báo "không có API key / dùng client chung" là đương nhiên ở đây
+    try:
+        rag = KaliRAGService(None, answer_cache=answer_cache)
+        # TranslationService dựng LLMChain + prompt + output parser thật quanh FakeLLM.
+        translation = TranslationService(None, answer_cache=answer_cache,
+                                         llm=RunnableLambda(sync_call_not_supported, afunc=translation_llm.ainvoke))
+    finally:
+        logging.disable(logging.NOTSET)
+    rag._state = _IndexState("loadtest", rag_chain_phase1=rag_llm, llm_chain_phase2=rag_llm,
+                             canonical_answers=canonical_answers)
+    return rag, translation, rag_llm, translation_llm
+
+
+async def _run_bot(application, state, warmup, duration):
+    async with application:
+        await application.start()
+        await application.updater.start_polling(poll_interval=0.0, timeout=1)
+        await asyncio.sleep(warmup)
+        state.start_load()
+        started = time.perf_counter()
+        await asyncio.sleep(duration)
+        state.stop_load()
+        elapsed = time.perf_counter() - started
+        await application.updater.stop()
+        await application.stop()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of measured load")
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument("--commands", nargs="+", default=list(COMMANDS), choices=list(COMMANDS))
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--llm-jitter", type=float, default=0.1)
+    parser.add_argument("--concurrent-updates", type=int, default=0,
+                        help="Application.concurrent_updates (0 = sequential, same as main.py)")
+    parser.add_argument("--no-context-rate", type=float, default=0.3,
+                        help="fraction of phase 1 answers that fall through to phase 2")
+    parser.add_argument("--distinct-queries", type=int, default=1000, help="distinct /ask_kali and /translate texts")
+    parser.add_argument("--answer-cache", action="store_true", help="shared answer cache (memory:// queue backend)")
+    parser.add_argument("--no-request-log", action="store_true", help="do not write the /ask_kali request log")
+    args = parser.parse_args()
+
+    # main.py validates these at import time; the fake server accepts any token.
+    os.environ.setdefault("TELEGRAM_BOT_TOKEN", FAKE_TOKEN)
+    os.environ.setdefault("GOOGLE_API_KEY", "loadtest")
+    # Đọc lúc import cogs.canonical_answers: bật request log (ghi vào thư mục tạm) trước khi import.
+    request_log_dir = tempfile.TemporaryDirectory()
+    request_log_path = os.path.join(request_log_dir.name, "ask_kali_requests.jsonl")
+    os.environ["ASK_KALI_REQUEST_LOG_ENABLED"] = "0" if args.no_request_log else "1"
+    os.environ["ASK_KALI_REQUEST_LOG"] = request_log_path
+    import logging
+    from telegram.ext import Application
+    import main as bot_main
+    import cogs.commands
+    from cogs.queue_backend import create_queue_backend
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    answer_cache = create_queue_backend("memory://") if args.answer_cache else None
+    rag, translation, rag_llm, translation_llm = _build_services(args, answer_cache)
+    cogs.commands.kali_rag_service_instance = rag
+    cogs.commands.translation_service_instance = translation
+
+    state = FakeBotAPIState(args.chats, args.commands, args.distinct_queries)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/bot"
+
+    builder = (Application.builder().token(os.environ["TELEGRAM_BOT_TOKEN"])
+               .base_url(base_url).base_file_url(base_url.replace("/bot", "/file/bot")))
+    if args.concurrent_updates:
+        # Bot API calls share one HTTP connection pool; size it to the handler concurrency.
+        builder = builder.concurrent_updates(args.concurrent_updates).connection_pool_size(args.concurrent_updates + 4)
+    application = builder.build()
+    bot_main.register_handlers(application)
+
+    print(f"Fake Bot API at {base_url} | {args.chats} chats | commands {args.commands} | "
+          f"LLM {args.llm_latency:.2f}s±{args.llm_jitter:.2f} | concurrent_updates={args.concurrent_updates or 'off'} | "
+          f"answer cache {'on' if answer_cache else 'off'}")
+    elapsed = asyncio.run(_run_bot(application, state, args.warmup, args.duration))
+    server.shutdown()
+
+    total = sum(len(v) for v in state.latencies.values())
+    all_latencies = [latency for values in state.latencies.values() for latency in values]
+    print(f"\nsustained: {total / elapsed:.1f} updates/s ({total} completed in {elapsed:.1f}s)")
+    print(f"{'command':>14} {'count':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for command, latencies in sorted(state.latencies.items()) + [("all", all_latencies)]:
+        print(f"{command:>14} {len(latencies):>7} {_percentile(latencies, 0.5) * 1000:>8.0f} "
+              f"{_percentile(latencies, 0.9) * 1000:>8.0f} {_percentile(latencies, 0.99) * 1000:>8.0f} "
+              f"{(max(latencies) if latencies else float('nan')) * 1000:>8.0f}")
+    print("\nBot API calls: " + ", ".join(f"{method}={count}" for method, count in state.api_calls.most_common()))
+    print(f"FakeLLM calls: rag={rag_llm.calls}, translation={translation_llm.calls}")
+    if not args.no_request_log:
+        from cogs.canonical_answers import close_request_log, load_request_log
+        close_request_log()
+        print(f"Request log: {len(load_request_log(request_log_path))} queries written")
+    request_log_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
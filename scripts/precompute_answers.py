@@ -0,0 +1,116 @@
+"""
+Pre-generates sanitized canonical "how do I use <tool>" answers for /ask_kali.
+
+Only tools whose source record in data/kali_tools_data.json changed (or that have
+no answer yet) are regenerated, so re-running after a scrape is cheap.
+
+    python3 scripts/precompute_answers.py                  # every tool
+    python3 scripts/precompute_answers.py --top-n 50       # 50 most-asked tools from the request log
+    python3 scripts/precompute_answers.py --snapshot 20260101T000000   # answers stored inside that index snapshot
+
+Without --snapshot the live snapshot (chroma_db/CURRENT) is used when there is one.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cogs.canonical_answers import (CANONICAL_ANSWERS_FILE, REQUEST_LOG_FILE, CanonicalAnswerStore,
+                                    canonical_question, load_request_log, match_tool_name, tool_record_hash)
+from cogs import index_snapshots
+from cogs.kali_rag import DATA_FILE, KaliRAGService
+from cogs.sanitize import sanitize_telegram_html
+
+
+def select_tools(tools_by_name, top_n, request_log):
+    if not top_n:
+        return list(tools_by_name)
+    tool_names_by_lower = {name.lower(): name for name in tools_by_name}
+    counts = Counter()
+    for query in load_request_log(request_log):
+        tool_name = match_tool_name(query, tool_names_by_lower)
+        if tool_name:
+            counts[tool_name] += 1
+    return [name for name, _ in counts.most_common(top_n)]
+
+
+async def generate_all(service, store, tools_by_name, selected, concurrency, force):
+    semaphore = asyncio.Semaphore(concurrency)
+    stats = Counter()
+
+    async def generate_one(tool_name):
+        source_hash = tool_record_hash(tools_by_name[tool_name])
+        if not force and store.is_fresh(tool_name, source_hash):
+            stats["unchanged"] += 1
+            return
+        async with semaphore:
+            try:
+                raw_answer = await service.ask_question(canonical_question(tool_name), use_canonical=False)
+            except Exception as e:
+                print(f"[{time.strftime('%H:%M:%S')}] Failed to generate answer for '{tool_name}': {e}")
+                stats["failed"] += 1
+                return
+        answer_html = sanitize_telegram_html(raw_answer)
+        if not answer_html:
+            stats["failed"] += 1
+            return
+        store.put(tool_name, source_hash, answer_html)
+        stats["generated"] += 1
+        if stats["generated"] % 20 == 0:
+            store.save()  # checkpoint, so an interrupted run keeps its progress
+            print(f"[{time.strftime('%H:%M:%S')}] Generated {stats['generated']} answers so far...")
+
+    await asyncio.gather(*(generate_one(name) for name in selected))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top-n", type=int, default=0, help="only the N most-asked tools from the request log (0 = all tools)")
+    parser.add_argument("--request-log", default=REQUEST_LOG_FILE)
+    parser.add_argument("--snapshot", metavar="VERSION", help="index snapshot to read tools from and store answers in")
+    parser.add_argument("--output", help="answers file (default: the snapshot's, or chroma_db/canonical_answers.json)")
+    parser.add_argument("--concurrency", type=int, default=4, help="max concurrent Gemini calls")
+    parser.add_argument("--force", action="store_true", help="regenerate even if the tool record is unchanged")
+    args = parser.parse_args()
+
+    load_dotenv()
+    google_api_key = os.getenv("GOOGLE_API_KEY")
+    if not google_api_key:
+        print("GOOGLE_API_KEY not found in environment.")
+        sys.exit(1)
+
+    version = args.snapshot or index_snapshots.read_current_version()
+    data_file = index_snapshots.snapshot_data_file(version) if version else DATA_FILE
+    output = args.output or (index_snapshots.snapshot_canonical_answers_file(version) if version else CANONICAL_ANSWERS_FILE)
+
+    with open(data_file, 'r', encoding='utf-8') as f:
+        tools_by_name = {item["name"]: item for item in json.load(f) if item.get("name")}
+
+    service = KaliRAGService(google_api_key, index_version=version)
+    if service.rag_chain_phase1 is None:
+        print("RAG chains could not be initialized. Aborting.")
+        sys.exit(1)
+
+    store = CanonicalAnswerStore.load(output)
+    pruned = store.prune(set(tools_by_name))
+    selected = select_tools(tools_by_name, args.top_n, args.request_log)
+    if args.top_n and not selected:
+        print(f"No matching queries in {args.request_log} (the bot only writes it with ASK_KALI_REQUEST_LOG_ENABLED=1).")
+    print(f"[{time.strftime('%H:%M:%S')}] Precomputing answers for {len(selected)} tools (concurrency={args.concurrency})...")
+
+    stats = asyncio.run(generate_all(service, store, tools_by_name, selected, args.concurrency, args.force))
+    store.save()
+    print(f"[{time.strftime('%H:%M:%S')}] Done: {stats['generated']} generated, {stats['unchanged']} unchanged, "
+          f"{stats['failed']} failed, {pruned} removed. Saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cogs.canonical_answers import load_request_log, match_tool_name
+
+TOOL_NAMES = {name.lower(): name for name in ["nmap", "command-not-found", "help2man", "sqlmap"]}
+
+
+class MatchToolNameTest(unittest.TestCase):
+    def test_usage_intent_phrases_are_stripped(self):
+        for query in ["nmap", "how to use nmap?", "cách dùng nmap", "nmap command", "hướng dẫn sử dụng công cụ nmap"]:
+            self.assertEqual(match_tool_name(query, TOOL_NAMES), "nmap", query)
+
+    def test_intent_words_inside_tool_names_are_kept(self):
+        self.assertEqual(match_tool_name("command-not-found", TOOL_NAMES), "command-not-found")
+        self.assertEqual(match_tool_name("how to use command-not-found", TOOL_NAMES), "command-not-found")
+        self.assertEqual(match_tool_name("help2man usage", TOOL_NAMES), "help2man")
+
+    def test_other_questions_do_not_match(self):
+        self.assertIsNone(match_tool_name("how to scan udp ports with nmap", TOOL_NAMES))
+        self.assertIsNone(match_tool_name("sqlmap vs nmap", TOOL_NAMES))
+
+
+class RequestLogTest(unittest.TestCase):
+    def test_load_reads_rotated_backups(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "requests.jsonl")
+            for suffix, query in [("", "nmap"), (".1", "sqlmap"), (".2", "help2man")]:
+                with open(path + suffix, 'w', encoding='utf-8') as f:
+                    f.write(json.dumps({"ts": 0, "query": query}) + "\n")
+                    f.write("not json\n")
+            self.assertEqual(load_request_log(path), ["nmap", "sqlmap", "help2man"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cogs import index_snapshots
+
+
+class IndexSnapshotsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        root = self.tmp_dir.name
+        patcher = mock.patch.multiple(
+            index_snapshots,
+            SNAPSHOTS_DIR=os.path.join(root, "snapshots"),
+            CURRENT_VERSION_FILE=os.path.join(root, "CURRENT"),
+            HISTORY_FILE=os.path.join(root, "HISTORY"),
+            PINNED_FILE=os.path.join(root, "PINNED"),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp_dir.cleanup)
+        for version in ["v1", "v2", "v3"]:
+            os.makedirs(index_snapshots.snapshot_path(version))
+            index_snapshots.write_manifest(version, {"version": version})
+
+    def test_rollback_goes_to_previously_served_version_and_pins(self):
+        for version in ["v1", "v3", "v2"]:  # v2 was swapped in after v3
+            index_snapshots.publish_version(version)
+        self.assertEqual(index_snapshots.previous_served_version("v2"), "v3")
+
+        index_snapshots.record_rollback("v3")
+        self.assertEqual(index_snapshots.read_current_version(), "v3")
+        self.assertEqual(index_snapshots.read_pinned_version(), "v3")
+        # A second rollback keeps going back instead of bouncing to v2.
+        self.assertEqual(index_snapshots.previous_served_version("v3"), "v1")
+
+    def test_unpinned_publish_clears_pin(self):
+        index_snapshots.publish_version("v1")
+        index_snapshots.publish_version("v2", pinned=True)
+        self.assertEqual(index_snapshots.read_pinned_version(), "v2")
+        index_snapshots.publish_version("v3")
+        self.assertIsNone(index_snapshots.read_pinned_version())
+
+    def test_deleted_snapshots_are_skipped_and_missing_history_falls_back_to_build_order(self):
+        self.assertEqual(index_snapshots.previous_served_version("v3"), "v2")
+        for version in ["v1", "v2", "v3"]:
+            index_snapshots.publish_version(version)
+        os.remove(os.path.join(index_snapshots.snapshot_path("v2"), index_snapshots.MANIFEST_FILE_NAME))
+        self.assertEqual(index_snapshots.previous_served_version("v3"), "v1")
+
+
+if __name__ == "__main__":
+    unittest.main()
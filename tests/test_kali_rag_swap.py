@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from cogs import kali_rag
+    from cogs.kali_rag import KaliRAGService, _IndexState
+except ImportError:  # langchain / chromadb không có trong môi trường test
+    kali_rag = None
+
+logging.disable(logging.CRITICAL)
+
+
+@unittest.skipIf(kali_rag is None, "langchain/chromadb not installed")
+class IndexSwapTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.service = KaliRAGService(None)
+        self.service._state = _IndexState("v1", chroma_dir="/snapshots/v1")
+        self.states = {v: _IndexState(v, chroma_dir=f"/snapshots/{v}") for v in ["v1", "v2", "v3"]}
+        self.released = []
+        for patcher in (
+            mock.patch.object(self.service, "_load_snapshot", side_effect=lambda v: self.states[v]),
+            mock.patch.object(kali_rag, "_release_chroma_system", side_effect=self.released.append),
+            mock.patch.object(kali_rag, "RETIRED_STATE_POLL_SECONDS", 0.01),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def _drain(self):
+        while self.service._release_tasks:
+            await asyncio.gather(*self.service._release_tasks)
+
+    async def test_old_chroma_client_released_after_in_flight_requests(self):
+        old_state = self.service._state
+        old_state.in_flight = 1
+        self.assertTrue(await self.service.swap_to_version("v2"))
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.released, [], "still serving a request on v1")
+
+        old_state.in_flight = 0
+        await self._drain()
+        self.assertEqual(self.released, ["/snapshots/v1"])
+        self.assertEqual(self.service._retired_states, [])
+
+    async def test_not_released_when_swapped_back(self):
+        old_state = self.service._state
+        old_state.in_flight = 1
+        await self.service.swap_to_version("v2")
+        await self.service.swap_to_version("v1")
+        old_state.in_flight = 0
+        await self._drain()
+        self.assertEqual(self.released, ["/snapshots/v2"])
+
+    async def test_rollback_publishes_before_swapping(self):
+        calls = []
+        with mock.patch.object(kali_rag.index_snapshots, "previous_served_version", return_value="v3"), \
+             mock.patch.object(kali_rag.index_snapshots, "record_rollback", side_effect=lambda v: calls.append(("record", v))):
+            original_swap = self.service.swap_to_version
+
+            async def swap(version):
+                calls.append(("swap", version))
+                return await original_swap(version)
+
+            with mock.patch.object(self.service, "swap_to_version", side_effect=swap):
+                self.assertEqual(await self.service.rollback(), "v3")
+        self.assertEqual(calls, [("record", "v3"), ("swap", "v3")])
+        self.assertEqual(self.service.index_version, "v3")
+        await self._drain()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+import asyncio
+import contextvars
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cogs import logging_setup
+from cogs.logging_setup import RequestTimer, log_payload, new_request_id
+
+_saved_disable_level = logging.NOTSET
+
+
+def setUpModule():
+    # Các test module khác gọi logging.disable(logging.CRITICAL) lúc import.
+    global _saved_disable_level
+    _saved_disable_level = logging.root.manager.disable
+    logging.disable(logging.NOTSET)
+
+
+def tearDownModule():
+    logging.disable(_saved_disable_level)
+
+
+class JsonPipelineTest(unittest.TestCase):
+    def setUp(self):
+        root = logging.getLogger()
+        saved_handlers, saved_level = list(root.handlers), root.level
+
+        def restore():
+            logging_setup.stop_logging()
+            for handler in list(root.handlers):
+                root.removeHandler(handler)
+            for handler in saved_handlers:
+                root.addHandler(handler)
+            root.setLevel(saved_level)
+
+        self.addCleanup(restore)
+        self.stream = io.StringIO()
+        with mock.patch.object(logging_setup, "LOG_FORMAT", "json"), mock.patch.object(logging_setup, "LOG_LEVEL", "INFO"):
+            logging_setup.setup_logging(self.stream)
+        self.logger = logging.getLogger("tests.logging")
+
+    def _records(self) -> list[dict]:
+        logging_setup.stop_logging()  # flush the listener thread
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_json_fields_and_exc_text(self):
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            self.logger.error("failed %s", "hard", exc_info=True, extra={"fields": {"query": "nmap"}})
+        [record] = self._records()
+        self.assertEqual(record["level"], "ERROR")
+        self.assertEqual(record["logger"], "tests.logging")
+        self.assertEqual(record["msg"], "failed hard")
+        self.assertEqual(record["query"], "nmap")
+        self.assertIn("ts", record)
+        self.assertIn("Traceback", record["exc"])
+        self.assertIn("ValueError: boom", record["exc"])
+
+    def test_request_id_is_captured_before_the_queue(self):
+        def handle_update(update_id):
+            new_request_id(f"u{update_id}")
+            self.logger.info("handled")
+
+        threads = [threading.Thread(target=contextvars.copy_context().run, args=(handle_update, i)) for i in (1, 2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.logger.info("outside any request")
+        records = self._records()
+        self.assertEqual(sorted(r["request_id"] for r in records[:2]), ["u1", "u2"])
+        self.assertEqual(records[2]["request_id"], "-")
+
+
+class LogPayloadTest(unittest.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger("tests.payload")
+        self.context = contextvars.copy_context()
+
+    def _log_request(self, sample_payloads, level=logging.INFO):
+        def run():
+            new_request_id("u1", sample_payloads=sample_payloads)
+            log_payload(self.logger, "raw", "<b>raw</b>", query="q")
+            log_payload(self.logger, "bleached", "raw", query="q")
+            self.logger.info("done")
+
+        with self.assertLogs(self.logger, level=level) as captured:
+            self.context.run(run)
+        return [r for r in captured.records if r.getMessage() != "done"]
+
+    def test_error_always_logs_full_payload(self):
+        def run():
+            new_request_id("u1", sample_payloads=False)
+            log_payload(self.logger, "bad html", "<b>x</b>", error=True, query="q")
+
+        with self.assertLogs(self.logger, level=logging.ERROR) as captured:
+            self.context.run(run)
+        [record] = captured.records
+        self.assertEqual(record.levelno, logging.ERROR)
+        self.assertEqual(record.fields, {"query": "q", "payload": "<b>x</b>"})
+
+    def test_sampled_request_logs_every_payload(self):
+        records = self._log_request(sample_payloads=True)
+        self.assertEqual([r.getMessage() for r in records], ["raw", "bleached"])
+        self.assertTrue(all(r.fields["sampled"] and "payload" in r.fields for r in records))
+
+    def test_unsampled_request_logs_only_sizes_at_debug(self):
+        self.assertEqual(self._log_request(sample_payloads=False), [])
+        records = self._log_request(sample_payloads=False, level=logging.DEBUG)
+        self.assertEqual([r.fields for r in records], [{"query": "q", "payload_chars": 10}, {"query": "q", "payload_chars": 3}])
+
+    def test_sampling_decided_once_per_request(self):
+        with mock.patch.object(logging_setup, "LOG_PAYLOAD_SAMPLE_RATE", 0.5):
+            for _ in range(20):
+                records = self._log_request(sample_payloads=None, level=logging.DEBUG)
+                self.assertEqual(len({"payload" in r.fields for r in records}), 1)
+
+
+class RequestTimerTest(unittest.TestCase):
+    def test_slow_request_warning_has_stage_timings(self):
+        with mock.patch.object(logging_setup, "SLOW_REQUEST_THRESHOLD_SECONDS", 0.01):
+            timer = RequestTimer("ask_kali")
+            with timer.stage("rag"):
+                asyncio.run(asyncio.sleep(0.02))
+            with self.assertLogs("slow_requests", level=logging.WARNING) as captured:
+                total = timer.finish("empty_response")
+        [record] = captured.records
+        self.assertGreaterEqual(total, 0.02)
+        self.assertIn("Slow request: ask_kali", record.getMessage())
+        self.assertEqual(record.fields["status"], "empty_response")
+        self.assertGreaterEqual(record.fields["stages_ms"]["rag"], 20)
+
+    def test_fast_request_is_not_a_warning(self):
+        with mock.patch.object(logging_setup, "SLOW_REQUEST_THRESHOLD_SECONDS", 60):
+            with self.assertNoLogs("slow_requests", level=logging.WARNING):
+                RequestTimer("translate").finish()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cogs.memory_profile import build_memory_report, deep_sizeof
+
+BIG = 5_000_000
+
+
+class _Service:
+    def __init__(self, data, llm, answer_cache):
+        self.data = data
+        self.llm = llm
+        self.answer_cache = answer_cache
+        self.lock = asyncio.Lock()
+        self.task = None
+
+    def memory_components(self) -> dict:
+        return {"data": self.data}
+
+
+class DeepSizeofTest(unittest.IsolatedAsyncioTestCase):
+    async def test_does_not_walk_into_loop_tasks_or_locks(self):
+        loop = asyncio.get_running_loop()
+        loop.unrelated_data = bytearray(BIG)  # anything reachable from the running loop
+        self.addCleanup(delattr, loop, "unrelated_data")
+
+        class Holder:
+            pass
+
+        holder = Holder()
+        holder.lock = asyncio.Lock()
+        holder.task = loop.create_task(asyncio.sleep(10))
+        self.addCleanup(holder.task.cancel)
+        await asyncio.sleep(0)
+        size, _ = deep_sizeof(holder)
+        self.assertLess(size, 10_000)
+
+    def test_excluded_objects_are_not_counted(self):
+        shared = bytearray(BIG)
+        size, _ = deep_sizeof({"own": b"x" * 100, "shared": shared}, exclude_ids=frozenset({id(shared)}))
+        self.assertLess(size, 10_000)
+
+
+class MemoryReportTest(unittest.TestCase):
+    def test_shared_client_is_counted_once_under_every_owner(self):
+        llm = bytearray(BIG)
+        rag = _Service([b"a" * 1000], llm, None)
+        translation = _Service([b"b" * 1000], llm, None)
+        report = build_memory_report(
+            {"kali_rag": rag, "translation": translation, "tool_index": None},
+            {"kali_rag.llm": rag.llm, "translation.llm": translation.llm},
+        )
+        lines = report.splitlines()
+        self.assertIn("  tool_index: not initialized", lines)
+        service_lines = [line for line in lines if line.startswith(("  kali_rag data", "  translation data"))]
+        self.assertEqual(len(service_lines), 2)
+        for line in service_lines:
+            self.assertIn("KiB", line)  # the 5 MB client is not part of either service
+        shared_lines = [line for line in lines if "kali_rag.llm" in line]
+        self.assertEqual(len(shared_lines), 1)
+        self.assertIn("kali_rag.llm = translation.llm", shared_lines[0])
+        self.assertIn("MiB", shared_lines[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cogs import queue_backend
+from cogs.queue_backend import InMemoryQueueBackend, SQLiteQueueBackend, create_queue_backend
+
+
+class SQLiteQueueBackendTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "queue.db")
+        self.backend = SQLiteQueueBackend(self.db_path)
+
+    async def asyncTearDown(self):
+        await self.backend.close()
+        self.tmp_dir.cleanup()
+
+    async def test_fifo_order_per_queue(self):
+        for payload in ["a", "b", "c"]:
+            await self.backend.enqueue("q", payload)
+        await self.backend.enqueue("other", "x")
+        self.assertEqual([await self.backend.dequeue("q", timeout=0.1) for _ in range(3)], ["a", "b", "c"])
+        self.assertEqual(await self.backend.dequeue("other", timeout=0.1), "x")
+
+    async def test_dequeue_removes_payload_for_every_process(self):
+        await self.backend.enqueue("q", "only-once")
+        second = SQLiteQueueBackend(self.db_path)  # another worker process opening the same file
+        try:
+            self.assertEqual(await self.backend.queue_size("q"), 1)
+            self.assertEqual(await second.dequeue("q", timeout=0.1), "only-once")
+            self.assertEqual(await self.backend.queue_size("q"), 0)
+            self.assertIsNone(await self.backend.dequeue("q", timeout=0.1))
+        finally:
+            await second.close()
+
+    async def test_dequeue_timeout_returns_none(self):
+        started = time.monotonic()
+        self.assertIsNone(await self.backend.dequeue("empty", timeout=0.1))
+        self.assertGreaterEqual(time.monotonic() - started, 0.1)
+
+    async def test_cache_ttl_expires_and_deletes_row(self):
+        await self.backend.cache_set("k", "v", ttl_seconds=60)
+        await self.backend.cache_set("forever", "v")
+        self.assertEqual(await self.backend.cache_get("k"), "v")
+        with mock.patch.object(queue_backend.time, "time", return_value=time.time() + 61):
+            self.assertIsNone(await self.backend.cache_get("k"))
+            self.assertEqual(await self.backend.cache_get("forever"), "v")
+        count = self.backend._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        self.assertEqual(count, 1)
+
+    async def test_expired_rows_are_purged_periodically(self):
+        await self.backend.cache_set("stale", "v", ttl_seconds=1)
+        with mock.patch.object(queue_backend, "SQLITE_CACHE_PURGE_EVERY", 2), \
+             mock.patch.object(queue_backend.time, "time", return_value=time.time() + 5):
+            await self.backend.cache_set("fresh", "v", ttl_seconds=60)
+        keys = [row[0] for row in self.backend._conn.execute("SELECT key FROM cache")]
+        self.assertEqual(keys, ["fresh"])
+
+
+class InMemoryQueueBackendTest(unittest.IsolatedAsyncioTestCase):
+    async def test_fifo_and_timeout(self):
+        backend = InMemoryQueueBackend()
+        await backend.enqueue("q", "a")
+        await backend.enqueue("q", "b")
+        self.assertEqual(await backend.dequeue("q", timeout=0.1), "a")
+        self.assertEqual(await backend.dequeue("q", timeout=0.1), "b")
+        self.assertIsNone(await backend.dequeue("q", timeout=0.05))
+
+    async def test_cache_ttl(self):
+        backend = InMemoryQueueBackend()
+        await backend.cache_set("k", "v", ttl_seconds=60)
+        with mock.patch.object(queue_backend.time, "time", return_value=time.time() + 61):
+            self.assertIsNone(await backend.cache_get("k"))
+
+    async def test_cache_is_bounded_and_evicts_oldest(self):
+        backend = InMemoryQueueBackend(max_cache_entries=3)
+        for key in ["a", "b", "c"]:
+            await backend.cache_set(key, key)
+        await backend.cache_set("a", "a2")  # re-set moves "a" to the newest position
+        await backend.cache_set("d", "d")
+        self.assertIsNone(await backend.cache_get("b"))
+        self.assertEqual([await backend.cache_get(k) for k in ["a", "c", "d"]], ["a2", "c", "d"])
+        self.assertEqual(len(backend._cache), 3)
+
+
+class CreateQueueBackendTest(unittest.TestCase):
+    def test_urls(self):
+        self.assertIsInstance(create_queue_backend("memory://"), InMemoryQueueBackend)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            backend = create_queue_backend(f"sqlite:///{tmp_dir}/queue.db")
+            self.assertIsInstance(backend, SQLiteQueueBackend)
+            asyncio.run(backend.close())
+        with self.assertRaises(ValueError):
+            create_queue_backend("amqp://localhost")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import os
+import sys
+import time
+import unittest
+import unittest.mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cogs.fake_llm import FakeLLM, FakeLLMError
+from cogs.resilience import CircuitBreaker, CircuitOpenError, ResilientLLMCaller
+
+logging.disable(logging.CRITICAL)
+
+RESET_TIMEOUT = 0.05
+
+
+def _caller(failure_threshold=3, **kwargs):
+    kwargs.setdefault("backoff_base", 0.001)
+    kwargs.setdefault("hedging_enabled", False)
+    breaker = CircuitBreaker("test", failure_threshold=failure_threshold, reset_timeout=RESET_TIMEOUT)
+    return ResilientLLMCaller("test", breaker=breaker, **kwargs)
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def test_opens_after_threshold_and_half_opens_after_reset_timeout(self):
+        breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=RESET_TIMEOUT)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow_request())
+
+        time.sleep(RESET_TIMEOUT * 1.5)
+        self.assertTrue(breaker.allow_request())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(breaker.allow_request(), "only one probe while half-open")
+
+    def test_probe_success_closes(self):
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=RESET_TIMEOUT)
+        breaker.record_failure()
+        time.sleep(RESET_TIMEOUT * 1.5)
+        self.assertTrue(breaker.allow_request())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow_request())
+        self.assertTrue(breaker.allow_request())
+
+    def test_probe_failure_reopens(self):
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=RESET_TIMEOUT)
+        breaker.record_failure()
+        time.sleep(RESET_TIMEOUT * 1.5)
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow_request())
+
+
+class ResilientLLMCallerTest(unittest.IsolatedAsyncioTestCase):
+    async def test_half_open_lets_a_single_concurrent_probe_through(self):
+        llm = FakeLLM(latency=0.01, fault_rate=1.0, seed=1)
+        caller = _caller(failure_threshold=1, max_retries=0)
+        with self.assertRaises(FakeLLMError):
+            await caller.call(lambda: llm.ainvoke("q"))
+        self.assertEqual(caller.breaker.state, CircuitBreaker.OPEN)
+
+        await asyncio.sleep(RESET_TIMEOUT * 1.5)
+        llm.calls = 0
+        results = await asyncio.gather(*(caller.call(lambda: llm.ainvoke("q")) for _ in range(20)),
+                                       return_exceptions=True)
+        self.assertEqual(llm.calls, 1)
+        self.assertEqual(sum(isinstance(r, CircuitOpenError) for r in results), 19)
+        self.assertEqual(caller.breaker.state, CircuitBreaker.OPEN)
+
+    async def test_half_open_probe_success_closes_circuit(self):
+        llm = FakeLLM(latency=0.0, fault_rate=1.0, seed=1)
+        caller = _caller(failure_threshold=1, max_retries=0)
+        with self.assertRaises(FakeLLMError):
+            await caller.call(lambda: llm.ainvoke("q"))
+
+        await asyncio.sleep(RESET_TIMEOUT * 1.5)
+        llm.fault_rate = 0.0
+        self.assertEqual(await caller.call(lambda: llm.ainvoke("q")), llm.response)
+        self.assertEqual(caller.breaker.state, CircuitBreaker.CLOSED)
+
+    async def test_probe_without_verdict_is_released(self):
+        caller = _caller(failure_threshold=1, max_retries=0)
+        caller.breaker.record_failure()
+        await asyncio.sleep(RESET_TIMEOUT * 1.5)
+
+        async def non_retryable():
+            raise ValueError("bad prompt")
+
+        with self.assertRaises(ValueError):
+            await caller.call(non_retryable)
+        self.assertEqual(caller.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(caller.breaker.allow_request(), "next caller may probe")
+
+    async def test_retries_then_gives_up(self):
+        llm = FakeLLM(latency=0.0, fault_rate=1.0, seed=1)
+        caller = _caller(failure_threshold=100, max_retries=2)
+        with self.assertRaises(FakeLLMError):
+            await caller.call(lambda: llm.ainvoke("q"))
+        self.assertEqual(llm.calls, 3)
+
+    async def test_stops_retrying_once_circuit_opens(self):
+        llm = FakeLLM(latency=0.0, fault_rate=1.0, seed=1)
+        caller = _caller(failure_threshold=2, max_retries=5)
+        with self.assertRaises(FakeLLMError):
+            await caller.call(lambda: llm.ainvoke("q"))
+        self.assertEqual(llm.calls, 2)
+        with self.assertRaises(CircuitOpenError):
+            await caller.call(lambda: llm.ainvoke("q"))
+
+    async def test_attempt_timeout_is_retryable(self):
+        llm = FakeLLM(latency=1.0, seed=1)
+        caller = _caller(failure_threshold=100, max_retries=1, attempt_timeout=0.02)
+        with self.assertRaises(asyncio.TimeoutError):
+            await caller.call(lambda: llm.ainvoke("q"))
+        self.assertEqual(llm.calls, 2)
+
+    async def test_hedge_wins_and_slow_primary_is_cancelled(self):
+        caller = _caller(hedging_enabled=True, hedge_min_samples=1)
+        caller.latencies.append(0.02)
+        cancelled = []
+        calls = []
+
+        async def make_call():
+            calls.append(len(calls))
+            if len(calls) == 1:
+                try:
+                    await asyncio.sleep(5)
+                except asyncio.CancelledError:
+                    cancelled.append(True)
+                    raise
+                return "primary"
+            return "hedge"
+
+        self.assertEqual(await caller.call(make_call), "hedge")
+        await asyncio.sleep(0)
+        self.assertEqual(caller.hedges_fired, 1)
+        self.assertEqual(cancelled, [True])
+
+    async def test_hedging_is_off_by_default(self):
+        with unittest.mock.patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("LLM_HEDGING_ENABLED", None)
+            self.assertFalse(ResilientLLMCaller.from_env("test").hedging_enabled)
+        self.assertFalse(ResilientLLMCaller("test").hedging_enabled)
+
+    async def test_no_hedge_on_retry_attempts(self):
+        caller = _caller(hedging_enabled=True, hedge_min_samples=1, max_retries=1, failure_threshold=100)
+        caller.latencies.append(0.01)
+        calls = []
+
+        async def make_call():
+            calls.append(len(calls))
+            if len(calls) == 1:
+                raise ConnectionError("503")
+            await asyncio.sleep(0.05)  # slower than the p90, would trigger a hedge on the first attempt
+            return "ok"
+
+        self.assertEqual(await caller.call(make_call), "ok")
+        self.assertEqual(caller.hedges_fired, 0)
+        self.assertEqual(len(calls), 2)
+
+    def test_client_kwargs_disable_sdk_retries_and_cap_timeout(self):
+        caller = _caller(attempt_timeout=12.0)
+        self.assertEqual(caller.client_kwargs(), {"max_retries": 1, "timeout": 12.0})
+
+    async def test_no_hedge_when_primary_is_fast(self):
+        llm = FakeLLM(latency=0.0, seed=1)
+        caller = _caller(hedging_enabled=True, hedge_min_samples=1)
+        caller.latencies.append(0.5)
+        self.assertEqual(await caller.call(lambda: llm.ainvoke("q")), llm.response)
+        self.assertEqual(caller.hedges_fired, 0)
+        self.assertEqual(llm.calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cogs.tool_index import ToolLookupIndex
+
+
+def _write_tools(path, names):
+    tools = [{"name": name, "how_to_install": f"sudo apt install {name}", "url": "",
+              "commands": [{"sub_command": name, "usage_example": f"{name} -h"}]} for name in names]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(tools, f)
+
+
+class ToolLookupIndexTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "tools.json")
+        _write_tools(self.path, ["nmap", "ncat", "sqlmap"])
+        self.index = ToolLookupIndex(self.path)
+        self.index.build()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _names(self, query):
+        return [entry.name for entry in self.index.search(query)]
+
+    async def test_prefix_and_fuzzy_search(self):
+        self.assertEqual(self._names("n"), ["ncat", "nmap"])
+        self.assertEqual(self._names("nmpa"), ["nmap"])
+        self.assertEqual(self._names("zzz"), [])
+
+    async def test_rebuild_runs_off_loop_and_swaps_in(self):
+        other_path = os.path.join(self.tmp_dir.name, "tools2.json")
+        _write_tools(other_path, ["hydra"])
+        self.index.rebuild_in_background(other_path)
+        # Lookups keep serving the old data until the rebuild finishes.
+        self.assertEqual(self._names("nmap"), ["nmap"])
+        await self.index._rebuild_task
+        self.assertEqual(self._names("nmap"), [])
+        self.assertEqual(self._names("hyd"), ["hydra"])
+
+    async def test_rebuild_requests_are_coalesced(self):
+        builds = []
+        first_build_started, release_first_build = threading.Event(), threading.Event()
+        original_build = self.index.build
+
+        def blocking_build():
+            builds.append(self.index.filepath)
+            if len(builds) == 1:
+                first_build_started.set()
+                release_first_build.wait(5)
+            original_build()
+
+        self.index.build = blocking_build
+        self.index.rebuild_in_background()
+        await asyncio.to_thread(first_build_started.wait, 5)
+        for _ in range(5):  # arrive while the first build is running
+            self.index.rebuild_in_background()
+        release_first_build.set()
+        await self.index._rebuild_task
+        self.assertEqual(len(builds), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()